@@ -127,6 +127,19 @@ app.get('/moisture-all', async (req, res) => {
 
 // 📊 Enriched Moisture Data with Environmental Sensors
 app.get('/moisture-detailed', async (req, res) => {
+  // Time-range page (start/end as UTC ISO timestamps) for the ML data loader;
+  // pages are fetched once each, so they skip the cache
+  if (req.query.start && req.query.end) {
+    const bucketMin = Math.max(parseInt(req.query.bucket_min) || 60, 1);
+    try {
+      const { rows } = await pool.query(queries['moisture-detailed-range'], [bucketMin, req.query.start, req.query.end]);
+      return res.json(rows);
+    } catch (err) {
+      console.error('❌ /moisture-detailed range failed:', err);
+      return res.status(500).send(err.message);
+    }
+  }
+
   const windowMin = 43200; // 2 hours in minutes
   const bucketMin = 60;  // 2 minutes
 
@@ -1,15 +1,29 @@
+import asyncio
+import copy
+import hashlib
+import json
+import math
 import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from prophet import Prophet
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 from datetime import datetime, timedelta
 import logging
 import os
 from pathlib import Path
+from scipy.stats import norm
+
+try:
+    import orjson
+except ImportError:  # optional; responses fall back to the standard json encoder
+    orjson = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -39,11 +53,199 @@ prophet_model = None
 hw_model = None
 historical_df = None
 
+# Bumped on every model reload; part of the forecast cache key
+model_version = 0
+# Content hash of historical_df, computed once per CSV load
+historical_data_hash = None
+
+# Typed copy of df_wide.csv written next to it (df_wide.csv.feather)
+FEATHER_CACHE_SUFFIX = ".feather"
+FEATHER_INDEX_COLUMN = "__csv_row__"
+
+# Longest horizon served; forecasts are computed for it once and sliced
+MAX_FORECAST_DAYS = 365
+
+
+class ForecastCache:
+    """LRU cache of full-horizon forecasts keyed by (endpoint, model version, data hash)"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+forecast_cache = ForecastCache(max_entries=int(os.environ.get("FORECAST_CACHE_MAX_ENTRIES", 64)))
+
+
+class ProphetFitCache:
+    """LRU cache of Prophet models fitted on posted historical_data.
+
+    Entries are keyed by a content hash of the (ds, y) series. A series
+    that is not cached but overlaps a cached one (the frontend posts
+    sliding windows) can warm-start from that fit's parameters.
+    """
+
+    def __init__(self, max_entries: int = 32, min_overlap: float = 0.5):
+        self.max_entries = max_entries
+        self.min_overlap = min_overlap
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.warm_starts = 0
+        self.cold_fits = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['model']
+
+    def find_warm_start(self, df: pd.DataFrame):
+        """Fitted model whose data covers the largest share of df, if enough of it"""
+        start, end = df['ds'].min(), df['ds'].max()
+        best_model, best_overlap = None, self.min_overlap
+        
+        with self._lock:
+            for entry in self._entries.values():
+                if entry['end'] > end or entry['end'] < start:
+                    continue
+                overlap = df['ds'].between(max(entry['start'], start), entry['end']).mean()
+                if overlap >= best_overlap:
+                    best_model, best_overlap = entry['model'], overlap
+        
+        return best_model
+
+    def put(self, key: str, model, df: pd.DataFrame):
+        with self._lock:
+            self._entries[key] = {'model': model, 'start': df['ds'].min(), 'end': df['ds'].max()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_fit(self, warm_start: bool):
+        with self._lock:
+            if warm_start:
+                self.warm_starts += 1
+            else:
+                self.cold_fits += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "warm_starts": self.warm_starts,
+                "cold_fits": self.cold_fits
+            }
+
+
+prophet_fit_cache = ProphetFitCache(max_entries=int(os.environ.get("PROPHET_FIT_CACHE_MAX_ENTRIES", 32)))
+
+
+# Model fits/predictions run on this pool so the event loop keeps serving
+# /health and /api/status; beyond MODEL_MAX_PENDING queued or running calls
+# new forecast requests get a 503 instead of piling up
+MODEL_MAX_WORKERS = int(os.environ.get("MODEL_MAX_WORKERS", 2))
+MODEL_MAX_PENDING = int(os.environ.get("MODEL_MAX_PENDING", 8))
+model_executor = ThreadPoolExecutor(max_workers=MODEL_MAX_WORKERS, thread_name_prefix="model")
+pending_model_calls = 0
+rejected_model_calls = 0
+
+
+async def run_model_call(fn, *args):
+    """Run a CPU-bound model call on model_executor, or raise 503 when the queue is full"""
+    global pending_model_calls, rejected_model_calls
+    
+    # Only touched from the event loop, so no lock is needed
+    if pending_model_calls >= MODEL_MAX_PENDING:
+        rejected_model_calls += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Forecast queue is full, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
+    
+    loop = asyncio.get_running_loop()
+    future = model_executor.submit(fn, *args)
+    pending_model_calls += 1
+    # Released when the call itself finishes: a request cancelled while
+    # awaiting it leaves the call running on the pool
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(release_model_call))
+    return await asyncio.wrap_future(future)
+
+
+def release_model_call():
+    global pending_model_calls
+    pending_model_calls -= 1
+
+
+def dataframe_hash(df: pd.DataFrame, index: bool = True) -> str:
+    """Content hash of a DataFrame (values, and the index unless index=False)"""
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=index).values.tobytes()).hexdigest()
+
+
+def records_hash(records: List[Dict[str, Any]]) -> str:
+    """Content hash of posted historical_data records"""
+    payload = json.dumps(records, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
 
 # Pydantic models for request/response
+# How Prophet's yhat_lower/yhat_upper are produced:
+#   full      - the model's own simulation (uncertainty_samples, 1000 by default)
+#   reduced   - the same simulation with REDUCED_UNCERTAINTY_SAMPLES trajectories
+#   analytic  - yhat +/- z * observation noise; no sampling, ignores trend uncertainty
+#   none      - no intervals (yhat_lower = yhat_upper = yhat)
+UNCERTAINTY_MODES = ["full", "reduced", "analytic", "none"]
+DEFAULT_UNCERTAINTY_MODE = os.environ.get("DEFAULT_UNCERTAINTY_MODE", "analytic")
+REDUCED_UNCERTAINTY_SAMPLES = int(os.environ.get("REDUCED_UNCERTAINTY_SAMPLES", 100))
+
 class ForecastRequest(BaseModel):
     forecast_days: int = 90
     historical_data: Optional[List[Dict[str, Any]]] = None
+    # One of UNCERTAINTY_MODES; defaults to the cheap DEFAULT_UNCERTAINTY_MODE
+    uncertainty_mode: Optional[str] = None
+    # "rows" (list of points) or "columnar" (parallel arrays)
+    response_format: str = "rows"
 
 class ForecastPoint(BaseModel):
     ds: str  # date string
@@ -51,16 +253,122 @@ class ForecastPoint(BaseModel):
     yhat_lower: float  # confidence interval lower bound
     yhat_upper: float  # confidence interval upper bound
 
+class ForecastColumns(BaseModel):
+    ds: List[str]
+    yhat: List[float]
+    yhat_lower: List[float]
+    yhat_upper: List[float]
+
 class ForecastResponse(BaseModel):
-    forecast: List[ForecastPoint]
+    forecast: Union[List[ForecastPoint], ForecastColumns]
     model_type: str
     forecast_days: int
     generated_at: str
     data_points_used: int
+    uncertainty_mode: Optional[str] = None
+    response_format: str = "rows"
+
+RESPONSE_FORMATS = ["rows", "columnar"]
+
+def forecast_columns(ds, yhat, yhat_lower, yhat_upper) -> Dict[str, np.ndarray]:
+    """Forecast as parallel arrays (dates as strings, values rounded to 2 places)"""
+    return {
+        'ds': np.asarray(ds, dtype=object),
+        'yhat': np.round(np.asarray(yhat, dtype=float), 2),
+        'yhat_lower': np.round(np.asarray(yhat_lower, dtype=float), 2),
+        'yhat_upper': np.round(np.asarray(yhat_upper, dtype=float), 2)
+    }
+
+def finite_or_none(value: Any) -> Any:
+    """Copy of a JSON payload with NaN and infinite floats replaced by None"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: finite_or_none(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [finite_or_none(item) for item in value]
+    return value
+
+def encode_json(payload: Dict[str, Any]) -> bytes:
+    """JSON-encode a response payload, with orjson when it is installed.
+
+    Both paths write NaN and infinity as null (orjson does so itself), so
+    the output is always valid JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(finite_or_none(payload), separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+def forecast_response(columns: Dict[str, np.ndarray], days: int, response_format: str, **metadata) -> Response:
+    """Serialize the first days of a forecast straight from its arrays.
+
+    Builds the same JSON as ForecastResponse without creating a pydantic
+    object per point.
+    """
+    ds, yhat, yhat_lower, yhat_upper = (
+        columns[key][:days].tolist() for key in ['ds', 'yhat', 'yhat_lower', 'yhat_upper']
+    )
+    
+    if response_format == "columnar":
+        forecast = {'ds': ds, 'yhat': yhat, 'yhat_lower': yhat_lower, 'yhat_upper': yhat_upper}
+    else:
+        forecast = [
+            {'ds': d, 'yhat': y, 'yhat_lower': lower, 'yhat_upper': upper}
+            for d, y, lower, upper in zip(ds, yhat, yhat_lower, yhat_upper)
+        ]
+    
+    payload = {'forecast': forecast}
+    payload.update(metadata)
+    payload['response_format'] = response_format
+    return Response(content=encode_json(payload), media_type="application/json")
+
+def validate_response_format(request: ForecastRequest):
+    if request.response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"response_format must be one of {RESPONSE_FORMATS}")
+
+def clean_historical_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Typed, cleaned copy of the raw df_wide.csv frame"""
+    # Clean and standardize the data
+    if 'dbtimestamp' in df.columns:
+        df['dbtimestamp'] = pd.to_datetime(df['dbtimestamp'])
+    
+    # Ensure numeric columns are properly typed
+    numeric_columns = ['soil_moisture', 'soil_ph', 'soil_ec', 'soil_nitrogen', 'soil_phosphorus']
+    for col in numeric_columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    
+    # Remove rows with all NaN values
+    return df.dropna(how='all')
+
+def read_historical_csv(csv_path: str) -> pd.DataFrame:
+    """The cleaned df_wide.csv, read through a Feather copy kept next to it.
+
+    The copy holds the already typed columns, so a restart skips parsing the
+    CSV text and timestamps. It is rebuilt whenever the CSV is newer.
+    """
+    cache_path = csv_path + FEATHER_CACHE_SUFFIX
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(csv_path):
+            df = pd.read_feather(cache_path)
+            logger.info(f"Read historical data from Feather cache {cache_path}")
+            # The CSV row numbers are kept so the frame (and its hash) match a fresh parse
+            return df.set_index(FEATHER_INDEX_COLUMN).rename_axis(None)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring Feather cache {cache_path}: {e}")
+    
+    df = clean_historical_frame(pd.read_csv(csv_path))
+    try:
+        df.rename_axis(FEATHER_INDEX_COLUMN).reset_index().to_feather(cache_path)
+    except Exception as e:
+        logger.warning(f"Could not write Feather cache {cache_path}: {e}")
+    return df
 
 def load_historical_data():
     """Load the df_wide.csv file that contains your historical data"""
-    global historical_df
+    global historical_df, historical_data_hash
     
     try:
         # Look for the CSV file in common locations
@@ -81,20 +389,11 @@ def load_historical_data():
         if csv_path is None:
             raise FileNotFoundError("df_wide.csv not found in expected locations")
         
-        historical_df = pd.read_csv(csv_path)
-        
-        # Clean and standardize the data
-        if 'dbtimestamp' in historical_df.columns:
-            historical_df['dbtimestamp'] = pd.to_datetime(historical_df['dbtimestamp'])
-        
-        # Ensure numeric columns are properly typed
-        numeric_columns = ['soil_moisture', 'soil_ph', 'soil_ec', 'soil_nitrogen', 'soil_phosphorus']
-        for col in numeric_columns:
-            if col in historical_df.columns:
-                historical_df[col] = pd.to_numeric(historical_df[col], errors='coerce')
+        historical_df = read_historical_csv(csv_path)
+        historical_data_hash = dataframe_hash(historical_df)
         
-        # Remove rows with all NaN values
-        historical_df = historical_df.dropna(how='all')
+        # Forecasts computed from the previous data are stale
+        forecast_cache.clear()
         
         logger.info(f"Loaded historical data from {csv_path}: {len(historical_df)} rows")
         logger.info(f"Date range: {historical_df['dbtimestamp'].min()} to {historical_df['dbtimestamp'].max()}")
@@ -104,11 +403,13 @@ def load_historical_data():
     except Exception as e:
         logger.error(f"Failed to load historical data: {e}")
         historical_df = None
+        historical_data_hash = None
+        forecast_cache.clear()
         return False
 
 def load_models():
     """Load your trained ML models"""
-    global prophet_model, hw_model
+    global prophet_model, hw_model, model_version
     
     # Load Prophet soil moisture model
     try:
@@ -136,6 +437,10 @@ def load_models():
         logger.error(f"Failed to load Holt-Winters model: {e}")
         hw_model = None
 
+    # Forecasts computed with the previous models are stale
+    model_version += 1
+    forecast_cache.clear()
+
 @app.on_event("startup")
 async def startup_event():
     """Load models and data on startup"""
@@ -217,11 +522,108 @@ async def root():
         "data_points": len(historical_df) if historical_df is not None else 0
     }
 
-@app.post("/forecast/moisture", response_model=ForecastResponse)
-async def forecast_moisture(request: ForecastRequest):
-    """Generate soil moisture forecast using Prophet model"""
+def predict_with_uncertainty(model, future: pd.DataFrame, uncertainty_mode: str) -> pd.DataFrame:
+    """Prophet predict with yhat_lower/yhat_upper produced per uncertainty_mode"""
+    if uncertainty_mode == "full":
+        return model.predict(future)
+    
+    # A shallow copy shares the fitted params; only the sample count differs
+    model = copy.copy(model)
+    model.uncertainty_samples = REDUCED_UNCERTAINTY_SAMPLES if uncertainty_mode == "reduced" else 0
+    forecast = model.predict(future)
+    
+    if uncertainty_mode == "analytic":
+        # Fitted observation noise, scaled back to the data's units
+        sigma = float(np.mean(model.params['sigma_obs'])) * model.y_scale
+        half_width = norm.ppf(0.5 + model.interval_width / 2) * sigma
+        forecast['yhat_lower'] = forecast['yhat'] - half_width
+        forecast['yhat_upper'] = forecast['yhat'] + half_width
+    elif uncertainty_mode == "none":
+        forecast['yhat_lower'] = forecast['yhat']
+        forecast['yhat_upper'] = forecast['yhat']
+    
+    return forecast
+
+def new_prophet_model() -> Prophet:
+    """Unfitted Prophet model with the settings used for posted data"""
+    return Prophet(
+        daily_seasonality=True,
+        weekly_seasonality=True,
+        yearly_seasonality=False,
+        changepoint_prior_scale=0.05,
+        seasonality_prior_scale=10.0
+    )
+
+def warm_start_params(model) -> Dict[str, Any]:
+    """A fitted model's parameters in the form Stan accepts as init"""
+    return {
+        'k': model.params['k'][0][0],
+        'm': model.params['m'][0][0],
+        'sigma_obs': model.params['sigma_obs'][0][0],
+        'delta': model.params['delta'][0],
+        'beta': model.params['beta'][0]
+    }
+
+def fit_prophet_model(df: pd.DataFrame):
+    """Prophet model fitted on df, reused or warm-started from prophet_fit_cache"""
+    key = dataframe_hash(df[['ds', 'y']], index=False)
+    
+    model = prophet_fit_cache.get(key)
+    if model is not None:
+        logger.info("Reusing cached Prophet fit")
+        return model
+    
+    previous = prophet_fit_cache.find_warm_start(df)
+    model = new_prophet_model()
+    
+    if previous is not None:
+        try:
+            # Start the optimizer from the overlapping fit instead of from scratch;
+            # parameters with a different shape fall back to Prophet's defaults
+            logger.info("Training new Prophet model (warm start)")
+            model.fit(df, init=warm_start_params(previous))
+            prophet_fit_cache.record_fit(warm_start=True)
+        except Exception as e:
+            logger.warning(f"Warm start failed, fitting from scratch: {e}")
+            model = new_prophet_model()
+            previous = None
+    
+    if previous is None:
+        logger.info("Training new Prophet model")
+        model.fit(df)
+        prophet_fit_cache.record_fit(warm_start=False)
+    
+    prophet_fit_cache.put(key, model, df)
+    return model
+
+def prophet_forecast_points(model, forecast_days: int, uncertainty_mode: str = "full") -> Dict[str, np.ndarray]:
+    """Forecast columns for the forecast_days after the model's history"""
+    # Only the future rows are returned, so only they are predicted
+    future = model.make_future_dataframe(periods=forecast_days, freq='D', include_history=False)
+    
+    # Generate forecast
+    forecast_period = predict_with_uncertainty(model, future, uncertainty_mode)
+    
+    # Ensure moisture values are within realistic bounds
+    return forecast_columns(
+        forecast_period['ds'].dt.strftime('%Y-%m-%d').to_numpy(),
+        forecast_period['yhat'].clip(0, 100),
+        forecast_period['yhat_lower'].clip(0, 100),
+        forecast_period['yhat_upper'].clip(0, 100)
+    )
+
+def run_moisture_forecast(request: ForecastRequest) -> Response:
+    """Soil moisture forecast (blocking; runs on model_executor)"""
+    # Take the model once, so a concurrent reload cannot swap it mid-request
+    model, version = prophet_model, model_version
+    
     try:
-        forecast_days = min(request.forecast_days, 365)  # Limit to 1 year
+        forecast_days = min(request.forecast_days, MAX_FORECAST_DAYS)  # Limit to 1 year
+        
+        validate_response_format(request)
+        uncertainty_mode = request.uncertainty_mode or DEFAULT_UNCERTAINTY_MODE
+        if uncertainty_mode not in UNCERTAINTY_MODES:
+            raise HTTPException(status_code=400, detail=f"uncertainty_mode must be one of {UNCERTAINTY_MODES}")
         
         if request.historical_data:
             # Convert provided data to DataFrame
@@ -229,112 +631,131 @@ async def forecast_moisture(request: ForecastRequest):
             df['ds'] = pd.to_datetime(df['dbtimestamp'])
             df['y'] = pd.to_numeric(df['soil_moisture'], errors='coerce')
             df = df[['ds', 'y']].dropna()
+            data_hash = records_hash(request.historical_data)
         else:
             # Use your historical data or prepare sample data
             df = prepare_data_for_prophet()
+            data_hash = historical_data_hash if historical_df is not None else dataframe_hash(df)
         
         if len(df) < 10:
             raise HTTPException(status_code=400, detail="Insufficient historical data for forecasting")
         
-        # Use the loaded Prophet model or create a new one
-        if prophet_model is not None:
-            model = prophet_model
-            logger.info("Using pre-trained Prophet model")
-        else:
-            # Train a new Prophet model
-            logger.info("Training new Prophet model")
-            model = Prophet(
-                daily_seasonality=True,
-                weekly_seasonality=True,
-                yearly_seasonality=False,
-                changepoint_prior_scale=0.05,
-                seasonality_prior_scale=10.0
-            )
-            model.fit(df)
-        
-        # Create future dataframe
-        future = model.make_future_dataframe(periods=forecast_days, freq='D')
-        
-        # Generate forecast
-        forecast = model.predict(future)
-        
-        # Extract only the forecast period (not historical)
-        forecast_period = forecast.tail(forecast_days)
-        
-        # Format response
-        forecast_points = []
-        for _, row in forecast_period.iterrows():
-            # Ensure moisture values are within realistic bounds
-            yhat = max(0, min(100, row['yhat']))
-            yhat_lower = max(0, min(100, row['yhat_lower']))
-            yhat_upper = max(0, min(100, row['yhat_upper']))
+        # The full horizon is cached once; shorter horizons are slices of it
+        cache_key = ("moisture", version, data_hash, uncertainty_mode)
+        forecast_points = forecast_cache.get(cache_key)
+        
+        if forecast_points is None:
+            # Use the loaded Prophet model or create a new one
+            if model is not None:
+                logger.info("Using pre-trained Prophet model")
+            else:
+                # Train a new Prophet model (or reuse one fitted on this series)
+                model = fit_prophet_model(df)
             
-            forecast_points.append(ForecastPoint(
-                ds=row['ds'].strftime('%Y-%m-%d'),
-                yhat=round(yhat, 2),
-                yhat_lower=round(yhat_lower, 2),
-                yhat_upper=round(yhat_upper, 2)
-            ))
-        
-        return ForecastResponse(
-            forecast=forecast_points,
+            forecast_points = prophet_forecast_points(model, MAX_FORECAST_DAYS, uncertainty_mode)
+            forecast_cache.put(cache_key, forecast_points)
+        
+        return forecast_response(
+            forecast_points, forecast_days, request.response_format,
             model_type="Prophet (Facebook)",
             forecast_days=forecast_days,
             generated_at=datetime.now().isoformat(),
-            data_points_used=len(df)
+            data_points_used=len(df),
+            uncertainty_mode=uncertainty_mode
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in moisture forecast: {e}")
         raise HTTPException(status_code=500, detail=f"Moisture forecast failed: {str(e)}")
 
-@app.post("/forecast/ec", response_model=ForecastResponse)
-async def forecast_ec(request: ForecastRequest):
-    """Generate EC forecast using Holt-Winters model"""
+@app.post("/forecast/moisture", response_model=ForecastResponse)
+async def forecast_moisture(request: ForecastRequest):
+    """Generate soil moisture forecast using Prophet model"""
+    return await run_model_call(run_moisture_forecast, request)
+
+def hw_forecast_points(hw_model, values: np.ndarray, forecast_days: int) -> Dict[str, np.ndarray]:
+    """Holt-Winters forecast points for the forecast_days after the historical data"""
+    # Try different methods to generate forecast depending on model type
+    if hasattr(hw_model, 'forecast'):
+        # Standard statsmodels ExponentialSmoothing
+        forecast_values = hw_model.forecast(steps=forecast_days)
+        
+        # Generate confidence intervals
+        if hasattr(hw_model, 'prediction_intervals'):
+            conf_int = hw_model.prediction_intervals(steps=forecast_days, alpha=0.05)
+            lower_bounds = conf_int.iloc[:, 0].values
+            upper_bounds = conf_int.iloc[:, 1].values
+        else:
+            # Approximate confidence intervals
+            residuals_std = np.std(values[-50:]) if len(values) >= 50 else np.std(values)
+            lower_bounds = forecast_values - 1.96 * residuals_std
+            upper_bounds = forecast_values + 1.96 * residuals_std
+            
+    elif hasattr(hw_model, 'predict'):
+        # Alternative predict method
+        forecast_values = hw_model.predict(start=len(values), end=len(values) + forecast_days - 1)
+        residuals_std = np.std(values[-50:]) if len(values) >= 50 else np.std(values)
+        lower_bounds = forecast_values - 1.96 * residuals_std
+        upper_bounds = forecast_values + 1.96 * residuals_std
+        
+    else:
+        raise ValueError("Model doesn't have forecast or predict method")
+    
+    # Ensure forecast values are reasonable (non-negative)
+    forecast_values = np.maximum(forecast_values, 0)
+    lower_bounds = np.maximum(lower_bounds, 0)
+    upper_bounds = np.maximum(upper_bounds, 0)
+    
+    # Create date range for forecast
+    if historical_df is not None and 'dbtimestamp' in historical_df.columns:
+        last_date = historical_df['dbtimestamp'].max()
+    else:
+        last_date = datetime.now()
+        
+    start_date = last_date + timedelta(days=1)
+    dates = pd.date_range(start=start_date, periods=forecast_days, freq='D')
+    
+    return forecast_columns(dates.strftime('%Y-%m-%d').to_numpy(), forecast_values, lower_bounds, upper_bounds)
+
+def run_ec_forecast(request: ForecastRequest) -> Response:
+    """EC forecast (blocking; runs on model_executor)"""
+    # Take the model once, so a concurrent reload cannot swap it mid-request
+    model, version = hw_model, model_version
+    # Checked up front: errors below fall back to the trend-based forecast
+    validate_response_format(request)
+    
     try:
-        forecast_days = min(request.forecast_days, 365)  # Limit to 1 year
+        forecast_days = min(request.forecast_days, MAX_FORECAST_DAYS)  # Limit to 1 year
         
         if request.historical_data:
             # Convert provided data to array
             df = pd.DataFrame(request.historical_data)
             values = pd.to_numeric(df['soil_ec'], errors='coerce').dropna().values
+            # Forecast dates still start after the loaded CSV, so it is part of the key
+            data_hash = f"{records_hash(request.historical_data)}:{historical_data_hash}"
         else:
             # Use your historical data
             values = prepare_data_for_hw()
+            data_hash = historical_data_hash if historical_df is not None else None
         
         if len(values) < 20:
             raise HTTPException(status_code=400, detail="Insufficient historical data for EC forecasting")
         
         # Generate forecast using your trained Holt-Winters model
-        if hw_model is not None:
+        if model is not None:
             try:
                 logger.info("Using pre-trained Holt-Winters model")
                 
-                # Try different methods to generate forecast depending on model type
-                if hasattr(hw_model, 'forecast'):
-                    # Standard statsmodels ExponentialSmoothing
-                    forecast_values = hw_model.forecast(steps=forecast_days)
-                    
-                    # Generate confidence intervals
-                    if hasattr(hw_model, 'prediction_intervals'):
-                        conf_int = hw_model.prediction_intervals(steps=forecast_days, alpha=0.05)
-                        lower_bounds = conf_int.iloc[:, 0].values
-                        upper_bounds = conf_int.iloc[:, 1].values
-                    else:
-                        # Approximate confidence intervals
-                        residuals_std = np.std(values[-50:]) if len(values) >= 50 else np.std(values)
-                        lower_bounds = forecast_values - 1.96 * residuals_std
-                        upper_bounds = forecast_values + 1.96 * residuals_std
-                        
-                elif hasattr(hw_model, 'predict'):
-                    # Alternative predict method
-                    forecast_values = hw_model.predict(start=len(values), end=len(values) + forecast_days - 1)
-                    residuals_std = np.std(values[-50:]) if len(values) >= 50 else np.std(values)
-                    lower_bounds = forecast_values - 1.96 * residuals_std
-                    upper_bounds = forecast_values + 1.96 * residuals_std
-                    
-                else:
-                    raise ValueError("Model doesn't have forecast or predict method")
+                # The full horizon is cached once; shorter horizons are slices of it
+                cache_key = ("ec", version, data_hash)
+                forecast_points = forecast_cache.get(cache_key) if data_hash else None
+                
+                if forecast_points is None:
+                    forecast_points = hw_forecast_points(model, values, MAX_FORECAST_DAYS)
+                    if data_hash:
+                        forecast_cache.put(cache_key, forecast_points)
                     
             except Exception as model_error:
                 logger.warning(f"Pre-trained model failed: {model_error}, using trend-based forecast")
@@ -343,37 +764,15 @@ async def forecast_ec(request: ForecastRequest):
         else:
             logger.info("No pre-trained model, using trend-based forecasting")
             raise ValueError("No model available")
-            
-        # Ensure forecast values are reasonable (non-negative)
-        forecast_values = np.maximum(forecast_values, 0)
-        lower_bounds = np.maximum(lower_bounds, 0)
-        upper_bounds = np.maximum(upper_bounds, 0)
-        
-        # Create date range for forecast
-        if historical_df is not None and 'dbtimestamp' in historical_df.columns:
-            last_date = historical_df['dbtimestamp'].max()
-        else:
-            last_date = datetime.now()
-            
-        start_date = last_date + timedelta(days=1)
-        dates = [start_date + timedelta(days=i) for i in range(forecast_days)]
-        
-        # Format response
-        forecast_points = []
-        for i, date in enumerate(dates):
-            forecast_points.append(ForecastPoint(
-                ds=date.strftime('%Y-%m-%d'),
-                yhat=round(float(forecast_values[i]), 2),
-                yhat_lower=round(float(lower_bounds[i]), 2),
-                yhat_upper=round(float(upper_bounds[i]), 2)
-            ))
-        
-        return ForecastResponse(
-            forecast=forecast_points,
+        
+        return forecast_response(
+            forecast_points, forecast_days, request.response_format,
             model_type="Holt-Winters Exponential Smoothing",
             forecast_days=forecast_days,
             generated_at=datetime.now().isoformat(),
-            data_points_used=len(values)
+            data_points_used=len(values),
+            # Holt-Winters intervals are always +/- 1.96 residual std
+            uncertainty_mode="analytic"
         )
         
     except Exception as e:
@@ -391,35 +790,39 @@ async def forecast_ec(request: ForecastRequest):
             volatility = np.std(recent_values) * 0.3
             
             # Generate forecast
-            forecast_points = []
             start_date = datetime.now() + timedelta(days=1)
+            dates = pd.date_range(start=start_date, periods=forecast_days, freq='D')
+            steps = np.arange(forecast_days)
             
-            for i in range(forecast_days):
-                date = start_date + timedelta(days=i)
-                
-                # Add some seasonality and noise
-                seasonal = 50 * np.sin(i * 2 * np.pi / 30)  # Monthly seasonality
-                forecast_value = max(0, last_value + (trend * i) + seasonal)
-                
-                forecast_points.append(ForecastPoint(
-                    ds=date.strftime('%Y-%m-%d'),
-                    yhat=round(forecast_value, 2),
-                    yhat_lower=round(max(0, forecast_value - volatility), 2),
-                    yhat_upper=round(forecast_value + volatility, 2)
-                ))
+            # Add some seasonality and noise
+            seasonal = 50 * np.sin(steps * 2 * np.pi / 30)  # Monthly seasonality
+            forecast_values = np.maximum(0, last_value + (trend * steps) + seasonal)
+            
+            forecast_points = forecast_columns(
+                dates.strftime('%Y-%m-%d').to_numpy(),
+                forecast_values,
+                np.maximum(0, forecast_values - volatility),
+                forecast_values + volatility
+            )
             
-            return ForecastResponse(
-                forecast=forecast_points,
+            return forecast_response(
+                forecast_points, forecast_days, request.response_format,
                 model_type="Trend-based Fallback",
                 forecast_days=forecast_days,
                 generated_at=datetime.now().isoformat(),
-                data_points_used=len(values)
+                data_points_used=len(values),
+                uncertainty_mode=None
             )
             
         except Exception as fallback_error:
             logger.error(f"Fallback forecast also failed: {fallback_error}")
             raise HTTPException(status_code=500, detail=f"EC forecast failed: {str(e)}")
 
+@app.post("/forecast/ec", response_model=ForecastResponse)
+async def forecast_ec(request: ForecastRequest):
+    """Generate EC forecast using Holt-Winters model"""
+    return await run_model_call(run_ec_forecast, request)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -437,9 +840,33 @@ async def health_check():
                 "start": historical_df['dbtimestamp'].min().isoformat() if historical_df is not None else None,
                 "end": historical_df['dbtimestamp'].max().isoformat() if historical_df is not None else None
             } if historical_df is not None else None
+        },
+        "forecast_cache": forecast_cache.stats(),
+        "prophet_fit_cache": prophet_fit_cache.stats(),
+        "model_executor": {
+            "workers": MODEL_MAX_WORKERS,
+            "max_pending": MODEL_MAX_PENDING,
+            "pending": pending_model_calls,
+            "rejected": rejected_model_calls
         }
     }
 
+@app.post("/models/reload")
+async def reload_models():
+    """Reload the models and df_wide.csv (clears cached forecasts)"""
+    data_loaded = await run_model_call(load_historical_data)
+    await run_model_call(load_models)
+    
+    return {
+        "models": {
+            "prophet_moisture": "loaded" if prophet_model else "not loaded",
+            "holt_winters_ec": "loaded" if hw_model else "not loaded"
+        },
+        "model_version": model_version,
+        "historical_loaded": data_loaded,
+        "data_points": len(historical_df) if historical_df is not None else 0
+    }
+
 @app.get("/models/info")
 async def model_info():
     """Get information about loaded models and data"""
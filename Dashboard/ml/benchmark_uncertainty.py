@@ -0,0 +1,67 @@
+"""
+Compare Prophet uncertainty modes on df_wide.csv: predict latency and how
+often held-out readings fall inside [yhat_lower, yhat_upper].
+
+Fits a Prophet model on the first 80% of the (hourly averaged) soil
+moisture series and evaluates each mode on the remaining 20%.
+
+    python benchmark_uncertainty.py
+"""
+import logging
+import time
+
+import numpy as np
+from prophet import Prophet
+
+import API
+
+REPEATS = 3
+HOLDOUT_FRACTION = 0.2
+
+logging.getLogger('cmdstanpy').disabled = True
+logging.getLogger('prophet').disabled = True
+
+def main():
+    print("🚀 PROPHET UNCERTAINTY MODE BENCHMARK")
+    print("=" * 70)
+
+    if not API.load_historical_data():
+        print("❌ df_wide.csv not found")
+        return
+
+    df = API.prepare_data_for_prophet()
+    df = df.set_index('ds').resample('1h').mean().dropna().reset_index()
+
+    split = int(len(df) * (1 - HOLDOUT_FRACTION))
+    train, holdout = df.iloc[:split], df.iloc[split:]
+    print(f"📊 {len(train)} training points, {len(holdout)} held-out points")
+
+    model = Prophet(
+        daily_seasonality=True,
+        weekly_seasonality=True,
+        yearly_seasonality=False,
+        changepoint_prior_scale=0.05,
+        seasonality_prior_scale=10.0
+    )
+    model.fit(train)
+
+    print(f"\n{'mode':<10}{'latency (ms)':>14}{'coverage':>11}{'mean width':>13}")
+    print("-" * 70)
+
+    for mode in API.UNCERTAINTY_MODES:
+        best = np.inf
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            forecast = API.predict_with_uncertainty(model, holdout[['ds']], mode)
+            best = min(best, time.perf_counter() - start)
+
+        y = holdout['y'].to_numpy()
+        coverage = np.mean((y >= forecast['yhat_lower'].to_numpy()) & (y <= forecast['yhat_upper'].to_numpy()))
+        width = np.mean(forecast['yhat_upper'] - forecast['yhat_lower'])
+
+        print(f"{mode:<10}{best * 1000:>14.1f}{coverage:>10.1%}{width:>13.2f}")
+
+    print(f"\n🎯 Nominal interval width: {model.interval_width:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import time
+import numpy as np
+import pandas as pd
+
+from feature_pipeline import FeaturePlan, prepare_readings
+
+HISTORY_LENGTHS = [48, 500, 5000, 50000, 500000]
+REPEATS = 5
+# pandas' .rolling() keeps running sums over the whole history, so it agrees
+# with the per-window statistics only to within rounding
+PANDAS_ROLLING_RTOL = 1e-9
+
+def make_readings(n_readings, seed=0):
+    """Synthetic hourly device history, prepared like the API's readings"""
+    rng = np.random.default_rng(seed)
+    moisture = 40 + 10 * np.sin(np.arange(n_readings) * 2 * np.pi / 24) + rng.normal(0, 1, n_readings)
+    df = pd.DataFrame({
+        'devicetimestamp': pd.date_range('2020-01-01', periods=n_readings, freq='h'),
+        'moisture': moisture,
+        'temperature': 25 + rng.normal(size=n_readings),
+        'npk_n': 10 + rng.normal(size=n_readings),
+        'npk_p': 5 + rng.normal(size=n_readings),
+        'npk_k': 8 + rng.normal(size=n_readings),
+        'co2': 400 + rng.normal(size=n_readings)
+    })
+    return prepare_readings(df, 'devicetimestamp')
+
+def full_pandas_row(plan, readings):
+    """Previous path: features over the whole history, then the last complete row"""
+    return plan.compute(readings)[plan.feature_names].dropna().tail(1)
+
+def check_match(plan, readings):
+    """Raise unless the NumPy row equals the full-history row bit for bit"""
+    expected = full_pandas_row(plan, readings)
+    actual = plan.latest_complete_row(readings)
+    assert expected.index.equals(actual.index), "rows come from different readings"
+    np.testing.assert_array_equal(actual.to_numpy(), expected.to_numpy())
+
+    moisture = readings['Soil Moisture']
+    for spec in plan.features:
+        if spec['kind'] == 'rolling':
+            rolling = moisture.rolling(spec['window'])
+            pandas_value = (rolling.mean() if spec['statistic'] == 'mean' else rolling.std()).iloc[-1]
+            np.testing.assert_allclose(actual[spec['name']].iloc[0], pandas_value, rtol=PANDAS_ROLLING_RTOL)
+
+def time_call(fn):
+    """Best-of-REPEATS wall time"""
+    best = np.inf
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    print("🚀 LATEST FEATURE ROW BENCHMARK")
+    print("=" * 64)
+
+    readings = make_readings(HISTORY_LENGTHS[-1])
+    plan = FeaturePlan.for_readings(readings)
+    plan = plan.select([column for column in plan.compute(readings.head(100)).columns if column != 'Soil Moisture'])
+    print(f"{len(plan.features)} features, lookback {plan.lookback} readings\n")
+
+    print(f"{'history':>8} | {'full pandas (ms)':>17} | {'NumPy tail (ms)':>16} | {'speedup':>8} | match")
+    print("-" * 64)
+
+    for n_readings in HISTORY_LENGTHS:
+        history = readings.tail(n_readings)
+        check_match(plan, history)
+
+        full_time = time_call(lambda: full_pandas_row(plan, history))
+        tail_time = time_call(lambda: plan.latest_complete_row(history))
+        print(f"{n_readings:>8} | {full_time * 1000:>17.2f} | {tail_time * 1000:>16.3f} | {full_time / tail_time:>7.0f}x | ✅")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import gzip
+import json
+import time
+import numpy as np
+import pandas as pd
+
+import wire_format
+from load_test import make_batch_payload
+
+# (devices, readings per device)
+PAYLOAD_SHAPES = [(10, 48), (100, 48), (100, 500), (1000, 48)]
+REPEATS = 5
+
+def parse_rows(body):
+    """Current format: JSON rows, then a frame and timestamp parse per device"""
+    frames = {}
+    for device_name, device_info in json.loads(body)['devices'].items():
+        df = pd.DataFrame(device_info['recent_data'])
+        df['devicetimestamp'] = pd.to_datetime(df['devicetimestamp'])
+        frames[device_name] = df
+    return frames
+
+def parse_columnar_json(body):
+    data = wire_format.decode_columnar_devices(json.loads(body))
+    return {device_name: device_info['recent_data'].to_frame() for device_name, device_info in data['devices'].items()}
+
+def parse_binary(mimetype):
+    def parse(body):
+        data = wire_format.parse_batch_request(mimetype, body, {'days_ahead': '30'})
+        return {device_name: device_info['recent_data'].to_frame() for device_name, device_info in data['devices'].items()}
+    return parse
+
+def time_parse(parse, body):
+    """Best-of-REPEATS wall time from request body to per-device DataFrames"""
+    best = np.inf
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        parse(body)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    print("🚀 BATCH REQUEST WIRE FORMAT BENCHMARK")
+    print("=" * 78)
+    print("Parse = request body -> one DataFrame per device with typed timestamps")
+
+    for n_devices, n_readings in PAYLOAD_SHAPES:
+        payload = make_batch_payload(n_devices, n_readings, days_ahead=30)
+        encodings = [
+            ('rows (JSON)', json.dumps(payload).encode('utf-8'), parse_rows),
+            ('columnar JSON', json.dumps(wire_format.encode_columnar_json(payload)).encode('utf-8'), parse_columnar_json),
+            ('msgpack', wire_format.encode_msgpack(payload), parse_binary('application/msgpack')),
+            ('Arrow IPC', wire_format.encode_arrow(payload), parse_binary('application/vnd.apache.arrow.stream'))
+        ]
+
+        print(f"\n📦 {n_devices} devices x {n_readings} readings")
+        print(f"{'encoding':>14} | {'size (KB)':>10} | {'gzip (KB)':>10} | {'parse (ms)':>10} | {'vs rows':>8}")
+        print("-" * 66)
+
+        rows_time = None
+        for name, body, parse in encodings:
+            parse_time = time_parse(parse, body)
+            rows_time = rows_time or parse_time
+            print(f"{name:>14} | {len(body) / 1024:>10.1f} | {len(gzip.compress(body)) / 1024:>10.1f} | "
+                  f"{parse_time * 1000:>10.2f} | {rows_time / parse_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,41 @@
+import json
+import os
 import joblib
 import pandas as pd
+from model_store import LEGACY_MODEL_PATH, MODEL_STORE_DIR, read_manifest
+
+def debug_model_store(manifest):
+    """Show the split artifact from its manifest, without loading any model file"""
+    print(f"📦 Model store: {MODEL_STORE_DIR} (format {manifest.get('format_version')})")
+    print(f"📋 Keys in manifest: {list(manifest.keys())}")
+
+    expected_keys = ['models', 'best_model_name', 'feature_names', 'training_timestamp']
+    print(f"\n🔍 Checking for expected keys:")
+    for key in expected_keys:
+        print(f"  - {key}: {'✅' if key in manifest else '❌'}")
+
+    print(f"\n🏆 Best model: {manifest.get('best_model_name')}")
+    print(f"📦 Model files:")
+    for model_name, entry in manifest.get('models', {}).items():
+        path = os.path.join(MODEL_STORE_DIR, entry.get('file', ''))
+        if os.path.isfile(path):
+            size = f"{os.path.getsize(path) / (1024 * 1024):.1f} MB"
+        else:
+            size = '❌ missing'
+        print(f"  - {model_name}: {entry.get('file')} ({size})")
+        print(f"    └─ Info: {json.dumps(entry.get('info', {}), default=str)[:200]}")
+
+    return manifest
 
 def debug_model_file():
     """Debug script to check what's in the model file"""
     try:
-        print("🔍 Loading model file...")
-        model_data = joblib.load('models/optimal_moisture_models.pkl')
+        manifest = read_manifest(MODEL_STORE_DIR)
+        if manifest is not None:
+            return debug_model_store(manifest)
+
+        print("🔍 No model store found, loading legacy model file...")
+        model_data = joblib.load(LEGACY_MODEL_PATH)
         
         print(f"📦 Model file type: {type(model_data)}")
         print(f"📋 Keys in model data: {list(model_data.keys()) if isinstance(model_data, dict) else 'Not a dict'}")
@@ -35,4 +65,4 @@ def debug_model_file():
         return None
 
 if __name__ == "__main__":
-    debug_model_file()
\ No newline at end of file
+    debug_model_file()
@@ -0,0 +1,303 @@
+"""
+Feature engineering shared by training, model selection and the prediction API.
+
+A FeaturePlan lists the features a model uses, each as a small declarative
+spec (kind plus parameters), e.g.
+
+    {'name': 'moisture_lag_6', 'kind': 'lag', 'inputs': ['Soil Moisture'], 'lag': 6}
+
+Training builds the plan of every feature the readings allow, picks the
+model's columns and stores plan.select(feature_names).to_dict() in the
+artifact. At inference the plan computes only those columns, and the
+newest row directly with NumPy from the last plan.lookback readings.
+"""
+import numpy as np
+import pandas as pd
+
+PLAN_VERSION = 1
+
+TARGET_COLUMN = 'Soil Moisture'
+MOISTURE_LAGS = [1, 2, 3, 6, 12, 24]
+ROLLING_WINDOWS = [3, 7, 14]
+NPK_COLUMNS = ['npk_n', 'npk_p', 'npk_k']
+RATIO_EPSILON = 1e-6
+
+# Cyclical time features: index attribute and its period
+TIME_CYCLES = {
+    'hour': ('hour', 24),
+    'day': ('dayofyear', 365),
+    'month': ('month', 12)
+}
+
+
+def derived_features():
+    """Specs of every derived feature, in the order they are added to a frame"""
+    specs = []
+    for cycle in TIME_CYCLES:
+        for function in ['sin', 'cos']:
+            specs.append({'name': f'{cycle}_{function}', 'kind': 'cyclical', 'inputs': [], 'cycle': cycle, 'function': function})
+
+    for lag in MOISTURE_LAGS:
+        specs.append({'name': f'moisture_lag_{lag}', 'kind': 'lag', 'inputs': [TARGET_COLUMN], 'lag': lag})
+    for window in ROLLING_WINDOWS:
+        for statistic in ['mean', 'std']:
+            specs.append({'name': f'moisture_rolling_{statistic}_{window}', 'kind': 'rolling',
+                          'inputs': [TARGET_COLUMN], 'window': window, 'statistic': statistic})
+
+    specs.append({'name': 'temp_moisture_ratio', 'kind': 'ratio', 'inputs': ['temperature', TARGET_COLUMN],
+                  'numerator': 'temperature', 'denominator': TARGET_COLUMN})
+    specs.append({'name': 'npk_total', 'kind': 'npk_total', 'inputs': NPK_COLUMNS})
+    for column in NPK_COLUMNS:
+        specs.append({'name': f'{column}_ratio', 'kind': 'npk_ratio', 'inputs': NPK_COLUMNS, 'column': column})
+    return specs
+
+
+def window_statistic(windows, statistic):
+    """mean or std (ddof=1) of each row of windows, NaN if the row has a NaN.
+
+    A window of one repeated value gets exactly that mean and a std of 0.
+    """
+    constant = (windows == windows[:, :1]).all(axis=1)
+    if statistic == 'mean':
+        return np.where(constant, windows[:, 0], windows.mean(axis=1))
+    return np.where(constant, 0.0, windows.std(axis=1, ddof=1))
+
+
+def rolling_statistic(values, starts, window, statistic):
+    """Trailing-window statistic of every row; NaN where the window reaches before the row's group start (starts)"""
+    result = np.full(len(values), np.nan)
+    if len(values) >= window:
+        # Row i of the view is values[i:i + window], the window ending at row i + window - 1
+        result[window - 1:] = window_statistic(np.lib.stride_tricks.sliding_window_view(values, window), statistic)
+    result[np.arange(len(values)) - (window - 1) < starts] = np.nan
+    return result
+
+
+def prepare_readings(df, timestamp_column='timestamp'):
+    """Readings indexed by time: 'moisture' renamed to the target, stable sort by timestamp"""
+    df = df.copy()
+    if 'moisture' in df.columns:
+        df.rename(columns={'moisture': TARGET_COLUMN}, inplace=True)
+
+    if timestamp_column in df.columns:
+        df[timestamp_column] = pd.to_datetime(df[timestamp_column])
+        # Stable, so readings sharing a timestamp keep their order
+        df = df.set_index(timestamp_column).sort_index(kind='mergesort')
+    return df
+
+
+class FeaturePlan:
+    """The features a model uses and how to compute each from the readings"""
+
+    def __init__(self, features):
+        self.features = features
+
+    @classmethod
+    def for_readings(cls, readings):
+        """Plan of every feature the prepared readings allow (training)"""
+        has_time = isinstance(readings.index, pd.DatetimeIndex)
+        return cls([
+            spec for spec in derived_features()
+            if all(column in readings.columns for column in spec['inputs'])
+            and (spec['kind'] != 'cyclical' or has_time)
+        ])
+
+    @classmethod
+    def for_names(cls, feature_names):
+        """Plan for a feature list; names that are not derived features are reading columns"""
+        derived = {spec['name']: spec for spec in derived_features()}
+        return cls([
+            derived.get(name, {'name': name, 'kind': 'input', 'inputs': [name]})
+            for name in feature_names
+        ])
+
+    @classmethod
+    def from_model_data(cls, model_data):
+        """The artifact's stored plan; artifacts from before plans were stored get one from feature_names"""
+        if model_data.get('feature_plan'):
+            return cls.from_dict(model_data['feature_plan'])
+        if model_data.get('feature_names'):
+            return cls.for_names(model_data['feature_names'])
+        return None
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != PLAN_VERSION:
+            raise ValueError(f"Unsupported feature plan version: {data.get('version')}")
+        return cls([dict(spec) for spec in data['features']])
+
+    def to_dict(self):
+        return {'version': PLAN_VERSION, 'features': self.features, 'lookback': self.lookback}
+
+    @property
+    def feature_names(self):
+        return [spec['name'] for spec in self.features]
+
+    @property
+    def lookback(self):
+        """Readings needed to compute the features of the newest one"""
+        rows = [1]
+        for spec in self.features:
+            if spec['kind'] == 'lag':
+                rows.append(spec['lag'] + 1)
+            elif spec['kind'] == 'rolling':
+                rows.append(spec['window'])
+        return max(rows)
+
+    def select(self, feature_names):
+        """Plan restricted to feature_names, in that order"""
+        planned = {spec['name']: spec for spec in self.features}
+        return FeaturePlan([
+            planned.get(name) or FeaturePlan.for_names([name]).features[0]
+            for name in feature_names
+        ])
+
+    def check_inputs(self, readings):
+        missing = sorted({column for spec in self.features for column in spec['inputs']} - set(readings.columns))
+        if missing:
+            raise ValueError(f"Readings lack columns needed by the feature plan: {missing}")
+
+    def compute(self, readings, group_keys=None):
+        """Prepared readings plus one column per planned feature.
+
+        With group_keys (one key per row, each group's rows contiguous and in
+        time order) lags and rolling windows never cross a group boundary.
+        """
+        self.check_inputs(readings)
+
+        df = readings.copy()
+        target = None
+        if TARGET_COLUMN in df.columns:
+            target = df[TARGET_COLUMN]
+            target_values = np.asarray(target, dtype=np.float64)
+            starts = np.zeros(len(df), dtype=np.int64)
+            if group_keys is not None:
+                target = target.groupby(group_keys, sort=False)
+                group_keys = np.asarray(group_keys)
+                new_group = np.append(True, group_keys[1:] != group_keys[:-1])
+                starts = np.maximum.accumulate(np.where(new_group, np.arange(len(df)), 0))
+
+        npk_total = None
+        for spec in self.features:
+            kind = spec['kind']
+            if kind == 'input':
+                continue
+
+            if kind == 'cyclical':
+                if not isinstance(df.index, pd.DatetimeIndex):
+                    raise ValueError(f"{spec['name']} needs timestamped readings")
+                attribute, period = TIME_CYCLES[spec['cycle']]
+                function = np.sin if spec['function'] == 'sin' else np.cos
+                values = function(2 * np.pi * getattr(df.index, attribute) / period)
+            elif kind == 'lag':
+                values = target.shift(spec['lag'])
+            elif kind == 'rolling':
+                # Computed per window (not as running sums), so a row's value does
+                # not depend on how much history precedes it (see latest_values)
+                values = rolling_statistic(target_values, starts, spec['window'], spec['statistic'])
+            elif kind == 'ratio':
+                values = df[spec['numerator']] / (df[spec['denominator']] + RATIO_EPSILON)
+            elif kind in ['npk_total', 'npk_ratio']:
+                if npk_total is None:
+                    npk_total = df[NPK_COLUMNS].sum(axis=1)
+                values = npk_total if kind == 'npk_total' else df[spec['column']] / (npk_total + RATIO_EPSILON)
+            else:
+                raise ValueError(f"Unknown feature kind: {kind}")
+
+            df[spec['name']] = np.asarray(values)
+
+        return df
+
+    def latest_values(self, readings, ends):
+        """Features of the newest reading of each group, computed directly with NumPy.
+
+        Groups are contiguous runs of rows in time order and ends holds the
+        position one past each group's last row. Only the last lookback
+        readings of a group are read. Returns an (n_groups, n_features) array
+        with the values compute() gives those rows (NaN where a lag or window
+        reaches before the group's first reading).
+        """
+        self.check_inputs(readings)
+
+        ends = np.asarray(ends, dtype=np.int64)
+        last = ends - 1
+        starts = np.concatenate([[0], ends[:-1]])
+        values = np.empty((len(ends), len(self.features)))
+
+        arrays = {}
+        def column(name):
+            if name not in arrays:
+                arrays[name] = readings[name].to_numpy()
+            return arrays[name]
+
+        def newest(name):
+            return np.asarray(column(name)[last], dtype=np.float64)
+
+        stamps = readings.index[last]
+        npk_total = None
+        for j, spec in enumerate(self.features):
+            kind = spec['kind']
+
+            if kind == 'input':
+                values[:, j] = newest(spec['name'])
+            elif kind == 'cyclical':
+                if not isinstance(readings.index, pd.DatetimeIndex):
+                    raise ValueError(f"{spec['name']} needs timestamped readings")
+                attribute, period = TIME_CYCLES[spec['cycle']]
+                function = np.sin if spec['function'] == 'sin' else np.cos
+                values[:, j] = function(2 * np.pi * np.asarray(getattr(stamps, attribute)) / period)
+            elif kind == 'lag':
+                positions = last - spec['lag']
+                lagged = np.asarray(column(TARGET_COLUMN)[np.maximum(positions, 0)], dtype=np.float64)
+                values[:, j] = np.where(positions >= starts, lagged, np.nan)
+            elif kind == 'rolling':
+                window = spec['window']
+                positions = last[:, None] - np.arange(window - 1, -1, -1)
+                windows = np.asarray(column(TARGET_COLUMN)[np.maximum(positions, 0)], dtype=np.float64)
+                statistic = window_statistic(windows, spec['statistic'])
+                values[:, j] = np.where(positions[:, 0] >= starts, statistic, np.nan)
+            elif kind == 'ratio':
+                values[:, j] = newest(spec['numerator']) / (newest(spec['denominator']) + RATIO_EPSILON)
+            elif kind in ['npk_total', 'npk_ratio']:
+                if npk_total is None:
+                    # Missing NPK readings count as 0, as in DataFrame.sum
+                    npk = np.column_stack([newest(name) for name in NPK_COLUMNS])
+                    npk_total = np.where(np.isnan(npk), 0.0, npk).sum(axis=1)
+                values[:, j] = npk_total if kind == 'npk_total' else newest(spec['column']) / (npk_total + RATIO_EPSILON)
+            else:
+                raise ValueError(f"Unknown feature kind: {kind}")
+
+        return values
+
+    def latest_complete_row(self, readings):
+        """Newest row whose planned features are all present, as a 1-row frame (empty if none)"""
+        return self.latest_complete_rows(readings)[0]
+
+    def latest_complete_rows(self, readings, group_keys=None):
+        """latest_complete_row of every group of a long frame (see compute): {key: 1-row frame}.
+
+        Without group_keys the frame is one group with key 0. The newest
+        reading's features come from latest_values; only a group whose
+        newest reading is incomplete is computed in full to find its last
+        complete row.
+        """
+        if group_keys is None:
+            group_keys = np.zeros(len(readings), dtype=np.int64)
+        group_keys = np.asarray(group_keys)
+        if len(group_keys) == 0:
+            return {0: pd.DataFrame(columns=self.feature_names)}
+
+        ends = np.flatnonzero(np.append(group_keys[1:] != group_keys[:-1], True)) + 1
+        values = self.latest_values(readings, ends)
+        complete = ~np.isnan(values).any(axis=1)
+
+        latest = {}
+        start = 0
+        for i, end in enumerate(ends):
+            key = group_keys[end - 1]
+            if complete[i]:
+                latest[key] = pd.DataFrame(values[i:i + 1], index=readings.index[end - 1:end], columns=self.feature_names)
+            else:
+                latest[key] = self.compute(readings.iloc[start:end])[self.feature_names].dropna().tail(1)
+            start = end
+        return latest
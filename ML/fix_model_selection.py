@@ -1,67 +1,16 @@
-import joblib
 import pandas as pd
 import numpy as np
-import requests
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-
-def fetch_live_detailed_data():
-    """Fetch data from your API endpoint"""
-    try:
-        url = "http://localhost:3001/moisture-detailed?bucket_min=2&window_min=10080"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        return pd.DataFrame(data)
-    except Exception as e:
-        print(f"❌ Error fetching data: {e}")
-        return None
-
-def prepare_features(df):
-    """Prepare features (simplified version)"""
-    df = df.copy()
-    
-    # Rename moisture column
-    if "moisture" in df.columns:
-        df.rename(columns={"moisture": "Soil Moisture"}, inplace=True)
-    
-    # Convert timestamp
-    if "timestamp" in df.columns:
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        df = df.set_index("timestamp").sort_index()
-        
-        # Basic time features
-        df['hour_sin'] = np.sin(2 * np.pi * df.index.hour / 24)
-        df['hour_cos'] = np.cos(2 * np.pi * df.index.hour / 24)
-        df['day_sin'] = np.sin(2 * np.pi * df.index.dayofyear / 365)
-        df['day_cos'] = np.cos(2 * np.pi * df.index.dayofyear / 365)
-        df['month_sin'] = np.sin(2 * np.pi * df.index.month / 12)
-        df['month_cos'] = np.cos(2 * np.pi * df.index.month / 12)
-    
-    # Lag features for soil moisture
-    if 'Soil Moisture' in df.columns:
-        for lag in [1, 2, 3, 6, 12, 24]:
-            df[f'moisture_lag_{lag}'] = df['Soil Moisture'].shift(lag)
-        
-        # Rolling statistics
-        for window in [3, 7, 14]:
-            df[f'moisture_rolling_mean_{window}'] = df['Soil Moisture'].rolling(window).mean()
-            df[f'moisture_rolling_std_{window}'] = df['Soil Moisture'].rolling(window).std()
-    
-    # NPK ratios
-    npk_cols = ['npk_n', 'npk_p', 'npk_k']
-    if all(col in df.columns for col in npk_cols):
-        df['npk_total'] = df[npk_cols].sum(axis=1)
-        for col in npk_cols:
-            df[f'{col}_ratio'] = df[col] / (df['npk_total'] + 1e-6)
-    
-    return df
+from feature_pipeline import FeaturePlan, prepare_readings
+from model_store import load_model_data, save_model_store
+from sensor_store import load_sensor_history
 
 def evaluate_models_and_select_best():
     """Load existing models, evaluate them, and select the best one"""
     
     print("🔍 Loading existing model file...")
     try:
-        model_data = joblib.load('models/optimal_moisture_models.pkl')
+        model_data, _ = load_model_data(mmap_mode=None)
     except Exception as e:
         print(f"❌ Error loading model file: {e}")
         return False
@@ -69,15 +18,17 @@ def evaluate_models_and_select_best():
     print("📊 Found models:", list(model_data['models'].keys()))
     
     # Fetch fresh data for evaluation
-    print("📡 Fetching fresh data for model evaluation...")
-    df = fetch_live_detailed_data()
+    print("📡 Syncing sensor history for model evaluation...")
+    df = load_sensor_history()
     
     if df is None or len(df) < 50:
         print("❌ Insufficient data for evaluation")
         return False
     
-    # Preprocess data
-    df = prepare_features(df)
+    # Preprocess data (the features the saved models were trained on)
+    readings = prepare_readings(df)
+    plan = FeaturePlan.from_model_data(model_data) or FeaturePlan.for_readings(readings)
+    df = plan.compute(readings)
     df = df.dropna()
     
     if len(df) < 30:
@@ -181,10 +132,11 @@ def evaluate_models_and_select_best():
     
     # Save updated model data
     print(f"\n💾 Saving updated model data...")
-    joblib.dump(model_data, 'models/optimal_moisture_models.pkl')
+    # New model files plus a swapped-in manifest, so a running API never sees a half-written artifact
+    save_model_store(model_data)
     
     print(f"✅ Updated model file saved!")
-    print(f"🎉 Your Flask API should now work with best model: {best_model_name}")
+    print(f"🎉 A running Flask API will pick up the new best model: {best_model_name}")
     
     return True
 
@@ -199,4 +151,4 @@ if __name__ == "__main__":
         print("Now you can run: python flask_api.py")
     else:
         print("\n❌ FAILED!")
-        print("You may need to retrain models: python train_models.py")
+        print("You may need to retrain models: python train_and_save.py")
@@ -1,118 +1,391 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-import joblib
+import itertools
+import json
 import logging
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime, timedelta
 import traceback
 import warnings
+from feature_pipeline import FeaturePlan, prepare_readings
+from model_bundle import ArtifactWatcher, ModelBundle, file_signature
+from model_cache import DeviceModelCache
+import model_store
+from retrain_jobs import JobCancelled, RetrainJobQueue, connect_job_queue
+import wire_format
+from wire_format import ReadingColumns
 warnings.filterwarnings('ignore')
 
+try:
+    import orjson
+except ImportError:  # optional; Flask's standard json provider is used instead
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes responses with orjson (numpy values included)"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 CORS(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global variables
-model_data = None
-model_loaded = False
-best_model = None
-best_model_name = None
-feature_names = None
+# Split artifact (manifest + one file per model), with the old single file as fallback
+MODEL_STORE_DIR = model_store.MODEL_STORE_DIR
+MODEL_PATH = model_store.LEGACY_MODEL_PATH
 
-def load_trained_models():
-    """Load the pre-trained optimal models"""
-    global model_data, model_loaded, best_model, best_model_name, feature_names
+# joblib mmap_mode for model files: 'c' maps arrays copy-on-write so processes
+# share the pages they only read; 'none' loads everything into private memory
+MODEL_MMAP_MODE = os.environ.get('MODEL_MMAP_MODE', 'c')
+if MODEL_MMAP_MODE.lower() == 'none':
+    MODEL_MMAP_MODE = None
+
+# Thread count for the forest's predict (unset keeps the trained n_jobs)
+MODEL_N_JOBS = os.environ.get('MODEL_N_JOBS')
+
+# The loaded models, swapped as one immutable bundle (None until loaded)
+model_bundle = None
+_bundle_version = 0
+_reload_lock = threading.Lock()
+
+# Seconds between checks of the model files for changes (0 disables the watcher)
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 5))
+
+# Full retrains are killed after this many seconds
+RETRAIN_TIMEOUT = float(os.environ.get('RETRAIN_TIMEOUT', 1800))
+
+# Per-device models written by train_and_save.py in per_device mode
+DEVICE_REGISTRY_DIR = os.environ.get('DEVICE_REGISTRY_DIR', 'models/devices')
+
+# Batch execution settings (each can be overridden per request)
+BATCH_EXECUTION_MODE = os.environ.get('BATCH_EXECUTION_MODE', 'parallel')
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', os.cpu_count() or 1))
+BATCH_DEVICE_TIMEOUT = float(os.environ.get('BATCH_DEVICE_TIMEOUT', 120))
+
+# How far (in training standard deviations) a device's recent mean may move
+# away from the training data before the stored ARIMA/SARIMA fit is refit
+ARIMA_DRIFT_THRESHOLD = float(os.environ.get('ARIMA_DRIFT_THRESHOLD', 3.0))
+
+# Steps of ARIMA/SARIMA forecast cached per device window; a request for the
+# same window with any horizon up to this is served from the cached path
+CACHED_FORECAST_DAYS = int(os.environ.get('CACHED_FORECAST_DAYS', 90))
+
+# Forecast layouts a prediction request can ask for: a list of
+# {day, date, predicted_moisture} points, or one parallel array per field
+RESPONSE_FORMATS = ['rows', 'columnar']
+
+# Per-device cache of forecast paths and the last forecast response
+model_cache = DeviceModelCache(
+    max_entries=int(os.environ.get('MODEL_CACHE_MAX_ENTRIES', 512)),
+    max_bytes=int(float(os.environ.get('MODEL_CACHE_MAX_MB', 256)) * 1024 * 1024),
+    ttl_seconds=float(os.environ.get('MODEL_CACHE_TTL', 600))
+)
+
+# How often a parallel batch checks its running devices against their timeout
+BATCH_POLL_INTERVAL = 0.1
+
+# Worker pool for parallel batch predictions (a PredictionPool, created lazily
+# per model version); the lock guards replacing it and its user counts
+_prediction_pool = None
+_executor_lock = threading.Lock()
+_task_ids = itertools.count()
+
+# Set in pool workers: queue the worker reports each task's start time to
+_task_started_queue = None
+
+def artifact_signature():
+    """On-disk signature of every file a bundle is loaded from"""
+    return file_signature([
+        model_store.manifest_path(MODEL_STORE_DIR),
+        MODEL_PATH,
+        os.path.join(DEVICE_REGISTRY_DIR, 'registry.json')
+    ])
+
+def load_trained_models(version=None):
+    """Load the pre-trained optimal models and swap them in as one bundle.
+
+    On failure the previously loaded bundle (if any) keeps serving.
+    """
+    global model_bundle, _bundle_version
+
+    with _reload_lock:
+        signature = artifact_signature()
+
+        try:
+            model_data, manifest = model_store.load_model_data(MODEL_STORE_DIR, MODEL_PATH, mmap_mode=MODEL_MMAP_MODE)
+        except FileNotFoundError:
+            logger.error("❌ Model file not found. Please run training script first.")
+            return model_bundle
+        except Exception as e:
+            logger.error(f"❌ Failed to load models: {e}")
+            return model_bundle
 
-    try:
-        model_data = joblib.load('models/optimal_moisture_models.pkl')
-        
         best_model_name = model_data.get('best_model_name')
         best_model = model_data.get('best_model')
-        feature_names = model_data.get('feature_names')
-        
-        if best_model_name and best_model:
-            model_loaded = True
-            logger.info(f"✅ Best model loaded: {best_model_name}")
-            logger.info(f"📊 Training date: {model_data.get('training_timestamp', 'Unknown')}")
-            
-            # Log available models
-            available_models = list(model_data.get('models', {}).keys())
-            logger.info(f"📦 Available models: {available_models}")
-            
-        else:
+
+        if not (best_model_name and best_model):
             logger.error("❌ No best model found in saved data")
-            model_loaded = False
-            
+            return model_bundle
+
+        try:
+            feature_plan = FeaturePlan.from_model_data(model_data)
+        except ValueError as e:
+            logger.error(f"❌ Failed to load feature plan: {e}")
+            return model_bundle
+
+        if MODEL_N_JOBS and hasattr(best_model.get('model'), 'n_jobs'):
+            # Trained with n_jobs=-1; serving workers get their own share of the cores
+            best_model['model'].n_jobs = int(MODEL_N_JOBS)
+
+        if version is None:
+            _bundle_version += 1
+            version = _bundle_version
+
+        new_bundle = ModelBundle(
+            version=version,
+            model_data=model_data,
+            manifest=manifest,
+            best_model_name=best_model_name,
+            best_model=best_model,
+            feature_names=model_data.get('feature_names'),
+            feature_plan=feature_plan,
+            device_registry=load_device_registry(),
+            registry_dir=DEVICE_REGISTRY_DIR,
+            source_signature=signature,
+            loaded_at=datetime.now().isoformat()
+        )
+
+        # Requests already holding the old bundle finish with it
+        model_bundle = new_bundle
+
+    logger.info(f"✅ Best model loaded: {best_model_name} (version {version})")
+    logger.info(f"📊 Training date: {model_data.get('training_timestamp', 'Unknown')}")
+
+    # Log available models
+    available_models = list(model_data.get('models', {}).keys())
+    logger.info(f"📦 Available models: {available_models}")
+
+    # Cached fits belong to the previous models
+    model_cache.clear()
+
+    return new_bundle
+
+def load_device_registry():
+    """Load the per-device registry index (device model files load on first use)"""
+    registry_path = os.path.join(DEVICE_REGISTRY_DIR, 'registry.json')
+    try:
+        with open(registry_path) as f:
+            device_registry = json.load(f).get('devices', {})
+        logger.info(f"📇 Device registry loaded: {len(device_registry)} devices")
+        return device_registry
     except FileNotFoundError:
-        logger.error("❌ Model file not found. Please run training script first.")
-        model_loaded = False
+        return {}
     except Exception as e:
-        logger.error(f"❌ Failed to load models: {e}")
-        model_loaded = False
+        logger.error(f"❌ Failed to load device registry: {e}")
+        return {}
+
+def start_model_watcher():
+    """Reload the models whenever training or fix_model_selection.py rewrites them"""
+    if MODEL_WATCH_INTERVAL <= 0:
+        return None
 
-def prepare_features_for_device(device_data):
-    """Prepare features from device data (same as training script)"""
+    return ArtifactWatcher(
+        signature_fn=artifact_signature,
+        loaded_signature_fn=lambda: model_bundle.source_signature if model_bundle else None,
+        on_change=load_trained_models,
+        interval=MODEL_WATCH_INTERVAL
+    ).start()
+
+def window_fingerprint(bundle, device_data):
+    """Cache fingerprint of a device's data window under one model version"""
+    if isinstance(device_data, ReadingColumns):
+        return f"{bundle.version}:{device_data.fingerprint()}"
+    return f"{bundle.version}:{model_cache.fingerprint(device_data)}"
+
+def readings_frame(device_data):
+    """DataFrame of a device's readings, sent as rows (list of dicts) or columns"""
+    if isinstance(device_data, ReadingColumns):
+        return device_data.to_frame()
+    return pd.DataFrame(device_data)
+
+def readings_schema(device_data):
+    """(columnar, field names) of a non-empty device window"""
+    if isinstance(device_data, ReadingColumns):
+        return True, tuple(device_data.keys())
+    return False, tuple(device_data[0].keys())
+
+def prepare_features_for_device(feature_plan, device_data):
+    """(readings indexed by time, latest complete feature row) of a device, or None.
+
+    Features are computed by the serving forest's feature plan, for the
+    newest readings only (see FeaturePlan.latest_complete_row).
+    """
     if not device_data:
         logger.warning("No device data provided")
         return None
     
     try:
-        df = pd.DataFrame(device_data)
-        
-        # Convert timestamp
-        if 'devicetimestamp' in df.columns:
-            df['devicetimestamp'] = pd.to_datetime(df['devicetimestamp'])
-            
-            # For prediction, we'll use the timestamp as index
-            df = df.set_index('devicetimestamp').sort_index()
-            
-            # Cyclical time features
-            df['hour_sin'] = np.sin(2 * np.pi * df.index.hour / 24)
-            df['hour_cos'] = np.cos(2 * np.pi * df.index.hour / 24)
-            df['day_sin'] = np.sin(2 * np.pi * df.index.dayofyear / 365)
-            df['day_cos'] = np.cos(2 * np.pi * df.index.dayofyear / 365)
-            df['month_sin'] = np.sin(2 * np.pi * df.index.month / 12)
-            df['month_cos'] = np.cos(2 * np.pi * df.index.month / 12)
-        
-        # Rename moisture column if needed
-        if 'moisture' in df.columns:
-            df.rename(columns={'moisture': 'Soil Moisture'}, inplace=True)
-        
-        # Lag features for soil moisture
-        if 'Soil Moisture' in df.columns:
-            for lag in [1, 2, 3, 6, 12, 24]:
-                df[f'moisture_lag_{lag}'] = df['Soil Moisture'].shift(lag)
-            
-            # Rolling statistics
-            for window in [3, 7, 14]:
-                df[f'moisture_rolling_mean_{window}'] = df['Soil Moisture'].rolling(window).mean()
-                df[f'moisture_rolling_std_{window}'] = df['Soil Moisture'].rolling(window).std()
-        
-        # Weather-based features
-        if 'temperature' in df.columns and 'Soil Moisture' in df.columns:
-            df['temp_moisture_ratio'] = df['temperature'] / (df['Soil Moisture'] + 1e-6)
-        
-        # NPK ratios
-        npk_cols = ['npk_n', 'npk_p', 'npk_k']
-        if all(col in df.columns for col in npk_cols):
-            df['npk_total'] = df[npk_cols].sum(axis=1)
-            for col in npk_cols:
-                df[f'{col}_ratio'] = df[col] / (df['npk_total'] + 1e-6)
-        
-        return df
+        readings = prepare_readings(readings_frame(device_data), 'devicetimestamp')
+        return readings, feature_plan.latest_complete_row(readings)
         
     except Exception as e:
         logger.error(f"Error preparing features: {e}")
         return None
 
-def predict_with_arima_sarima(device_name, device_data, days_ahead=30):
+def prepare_features_batch(feature_plan, devices_data):
+    """Prepare features for many devices in one vectorized pass.
+
+    Returns {device_name: (readings, latest row) or None} identical to
+    prepare_features_for_device, computed with grouped operations over a
+    single long-format frame instead of one frame per device.
+    """
+    features_by_device = {}
+
+    # Devices are batched per schema so every frame gets exactly its own columns;
+    # devices without timestamps keep the per-device path
+    schema_groups = {}
+    for device_name, device_data in devices_data.items():
+        if not device_data or 'devicetimestamp' not in readings_schema(device_data)[1]:
+            features_by_device[device_name] = prepare_features_for_device(feature_plan, device_data)
+            continue
+        schema_groups.setdefault(readings_schema(device_data), []).append(device_name)
+
+    for device_names in schema_groups.values():
+        try:
+            features_by_device.update(_prepare_features_group(
+                feature_plan, {device_name: devices_data[device_name] for device_name in device_names}
+            ))
+        except Exception as e:
+            logger.warning(f"Batched feature preparation failed, using per-device path: {e}")
+            for device_name in device_names:
+                features_by_device[device_name] = prepare_features_for_device(feature_plan, devices_data[device_name])
+
+    return features_by_device
+
+def _prepare_features_group(feature_plan, devices_data):
+    """Vectorized feature engineering for devices sharing one schema"""
+    device_names = list(devices_data.keys())
+    lengths = [len(device_data) for device_data in devices_data.values()]
+
+    if all(isinstance(device_data, ReadingColumns) for device_data in devices_data.values()):
+        # Columnar requests: concatenate the arrays, no per-reading objects
+        columns = next(iter(devices_data.values())).keys()
+        df = pd.DataFrame({
+            column: np.concatenate([device_data.columns[column] for device_data in devices_data.values()])
+            for column in columns
+        })
+    else:
+        df = pd.DataFrame([record for device_data in devices_data.values() for record in device_data])
+    device_keys = np.repeat(np.arange(len(device_names)), lengths)
+
+    df['devicetimestamp'] = pd.to_datetime(df['devicetimestamp'])
+
+    # Sort by device, then time (lexsort is stable like the per-device mergesort)
+    order = np.lexsort((df['devicetimestamp'].to_numpy(), device_keys))
+    df = df.iloc[order].set_index('devicetimestamp')
+    device_keys = device_keys[order]
+
+    # Rename moisture column if needed
+    if 'moisture' in df.columns:
+        df.rename(columns={'moisture': 'Soil Moisture'}, inplace=True)
+
+    # Lags and rolling windows never cross a device boundary
+    latest_rows = feature_plan.latest_complete_rows(df, device_keys)
+
+    # Devices are contiguous after the sort, so split by offsets
+    offsets = np.cumsum([0] + lengths)
+    return {
+        device_name: (df.iloc[offsets[i]:offsets[i + 1]], latest_rows[i])
+        for i, device_name in enumerate(device_names)
+    }
+
+def measure_drift(series, model_info):
+    """Shift of the series mean from the training mean, in training standard deviations"""
+    if 'train_mean' in model_info and 'train_std' in model_info:
+        train_mean, train_std = model_info['train_mean'], model_info['train_std']
+    else:
+        # Older model files did not store the statistics, so use the fitted data
+        train_endog = np.asarray(model_info['model'].model.endog, dtype=float).ravel()
+        train_mean, train_std = np.nanmean(train_endog), np.nanstd(train_endog)
+
+    return abs(float(series.mean()) - train_mean) / (train_std + 1e-6)
+
+def refit_state_space_model(moisture_series, model_info, model_name):
+    """Fit a fresh ARIMA/SARIMA with the stored orders on the given series"""
+    if model_name == 'ARIMA':
+        from statsmodels.tsa.arima.model import ARIMA
+
+        # Use the same order as the trained model
+        order = model_info.get('order', (1, 1, 1))
+
+        arima_model = ARIMA(moisture_series, order=order)
+        return arima_model.fit()
+
+    elif model_name == 'SARIMA':
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+        order = model_info.get('order', (1, 1, 1))
+        seasonal_order = model_info.get('seasonal_order', (1, 1, 1, 24))
+
+        sarima_model = SARIMAX(moisture_series, order=order, seasonal_order=seasonal_order)
+        return sarima_model.fit(disp=False)
+
+    raise ValueError(f"{model_name} is not a state-space model")
+
+def forecast_columns(forecast_dates, values):
+    """Forecast as parallel lists (the columnar response format)"""
+    return {
+        'day': list(range(1, len(forecast_dates) + 1)),
+        'date': [date.isoformat() for date in forecast_dates],
+        'predicted_moisture': np.round(np.asarray(values, dtype=float), 2).tolist()
+    }
+
+def format_prediction(result, response_format='rows'):
+    """Prediction result with its forecast laid out as response_format.
+
+    Results are computed and cached as columns; rows are only built here, for
+    the response, so the cached result itself is never changed.
+    """
+    if result is None or response_format == 'columnar' or not isinstance(result.get('forecast'), dict):
+        return result
+
+    forecast = result['forecast']
+    formatted = dict(result)
+    formatted['forecast'] = [
+        {'day': day, 'date': date, 'predicted_moisture': value}
+        for day, date, value in zip(forecast['day'], forecast['date'], forecast['predicted_moisture'])
+    ]
+    return formatted
+
+def predict_with_arima_sarima(bundle, device_name, device_data, days_ahead=30):
     """Predict using ARIMA/SARIMA models"""
     try:
-        df = pd.DataFrame(device_data)
+        # Dashboards poll the same window repeatedly, so check the cache first
+        fingerprint = window_fingerprint(bundle, device_data)
+        cached = model_cache.get(device_name, fingerprint)
+        if cached is not None and cached['days_ahead'] == days_ahead:
+            return cached['result']
+
+        df = readings_frame(device_data)
         
         # Convert timestamp and sort
         if 'devicetimestamp' in df.columns:
@@ -133,37 +406,47 @@ def predict_with_arima_sarima(device_name, device_data, days_ahead=30):
         if len(moisture_series) < 10:
             raise ValueError(f"Insufficient data for {device_name}: {len(moisture_series)} points")
         
-        # Get the model
-        model_info = best_model
-        
-        if best_model_name == 'ARIMA':
-            # For ARIMA, we need to refit with recent data or use stored model
-            from statsmodels.tsa.arima.model import ARIMA
-            
-            # Use the same order as the trained model
-            order = model_info.get('order', (1, 1, 1))
-            
-            # Fit ARIMA on recent data
-            arima_model = ARIMA(moisture_series, order=order)
-            arima_fitted = arima_model.fit()
-            
-            # Forecast
-            forecast = arima_fitted.forecast(steps=days_ahead)
-            
-        elif best_model_name == 'SARIMA':
-            # For SARIMA
-            from statsmodels.tsa.statespace.sarimax import SARIMAX
-            
-            order = model_info.get('order', (1, 1, 1))
-            seasonal_order = model_info.get('seasonal_order', (1, 1, 1, 24))
-            
-            # Fit SARIMA on recent data
-            sarima_model = SARIMAX(moisture_series, order=order, seasonal_order=seasonal_order)
-            sarima_fitted = sarima_model.fit(disp=False)
-            
-            # Forecast
-            forecast = sarima_fitted.forecast(steps=days_ahead)
-        
+        # Serve the device's own pre-fitted model when the registry has one
+        device_model = bundle.get_device_model(device_name)
+        if device_model is not None:
+            model_name, model_info = device_model
+            model_source = 'device'
+        else:
+            model_name, model_info = bundle.best_model_name, bundle.best_model
+            model_source = 'global'
+
+        moisture_series = moisture_series.reset_index(drop=True)
+
+        # Filter the new observations through the stored fit unless the data drifted
+        fitted_model = None
+        forecast_path = None
+        drift = None
+        if cached is not None and cached['model'] is not None and len(cached['model']) >= days_ahead:
+            # Same window as an earlier request, only the horizon changed
+            forecast_path = cached['model']
+            fit_mode = 'cached'
+        elif model_info.get('model') is not None:
+            drift = measure_drift(moisture_series, model_info)
+
+            if drift <= ARIMA_DRIFT_THRESHOLD:
+                try:
+                    fitted_model = model_info['model'].apply(moisture_series)
+                    fit_mode = 'warm_start'
+                except Exception as apply_error:
+                    logger.warning(f"Warm start failed for {device_name}, refitting: {apply_error}")
+            else:
+                logger.info(f"Drift {drift:.2f} > {ARIMA_DRIFT_THRESHOLD} for {device_name}, refitting")
+
+        if forecast_path is None and fitted_model is None:
+            fitted_model = refit_state_space_model(moisture_series, model_info, model_name)
+            fit_mode = 'refit'
+
+        # Forecast far enough ahead that other horizons for this window are a slice
+        # (the path is all that is cached; fitted results can be tens of MB)
+        if forecast_path is None:
+            forecast_path = np.asarray(fitted_model.forecast(steps=max(days_ahead, CACHED_FORECAST_DAYS)), dtype=float)
+        forecast = forecast_path[:days_ahead]
+
         # Generate forecast dates
         last_date = df['devicetimestamp'].max()
         forecast_dates = pd.date_range(
@@ -172,131 +455,469 @@ def predict_with_arima_sarima(device_name, device_data, days_ahead=30):
             freq='D'
         )
         
-        # Format results
-        forecast_data = []
-        for i, (date, value) in enumerate(zip(forecast_dates, forecast)):
-            forecast_data.append({
-                'day': i + 1,
-                'date': date.isoformat(),
-                'predicted_moisture': round(float(value), 2)
-            })
-        
-        return {
-            'forecast': forecast_data,
-            'model_used': best_model_name,
+        result = {
+            'forecast': forecast_columns(forecast_dates, forecast),
+            'model_used': model_name,
+            'model_source': model_source,
+            'fit_mode': fit_mode,
+            'drift': round(float(drift), 3) if drift is not None else None,
             'data_points_used': len(moisture_series)
         }
+
+        model_cache.put(device_name, fingerprint, forecast_path, days_ahead, result)
+        return result
         
     except Exception as e:
         logger.error(f"ARIMA/SARIMA prediction error for {device_name}: {e}")
         return None
 
-def predict_with_ml(device_name, device_data, days_ahead=30):
+def latest_feature_row(prepared):
+    """Most recent complete (no NaN) feature row of a device, as a 1-row frame"""
+    if prepared is None:
+        raise ValueError("Could not prepare features")
+
+    latest_features = prepared[1]
+
+    if len(latest_features) == 0:
+        raise ValueError("No complete feature records available")
+
+    return latest_features
+
+def serving_forest(bundle, device_name):
+    """(model_info, feature plan, model_source) of the Random Forest serving a device"""
+    device_model = bundle.get_device_model(device_name)
+    if device_model is not None and device_model[0] == 'RandomForest':
+        model_info = device_model[1]
+        return model_info, FeaturePlan.from_model_data(model_info), 'device'
+    return bundle.best_model, bundle.feature_plan, 'global'
+
+def build_ml_forecast(readings, current_prediction, days_ahead, model_source):
+    """Extrapolate the forest's current-conditions prediction into a forecast"""
+    # For ML models, we can't easily predict far into the future
+    # without future feature values, so we'll use a simple approach:
+    # assume gradual change based on current trends
+
+    moisture_series = readings['Soil Moisture'].dropna()
+    if len(moisture_series) > 5:
+        # Calculate recent trend
+        recent_trend = moisture_series.tail(5).diff().mean()
+    else:
+        recent_trend = 0
+
+    # Generate forecast with trend
+    last_date = readings.index[-1]
+    days = np.arange(1, days_ahead + 1)
+
+    # Simple trend-based prediction
+    predicted_values = current_prediction + (recent_trend * days * 0.1)  # Damped trend
+
+    # Ensure reasonable bounds
+    predicted_values = np.clip(predicted_values, 0, 100)
+
+    forecast_dates = last_date + pd.to_timedelta(days, unit='D')
+
+    return {
+        'forecast': forecast_columns(forecast_dates, predicted_values),
+        'model_used': 'RandomForest',
+        'model_source': model_source,
+        'note': 'ML prediction with trend extrapolation (limited accuracy for long-term)',
+        'data_points_used': len(moisture_series)
+    }
+
+def predict_with_ml(bundle, device_name, device_data, days_ahead=30):
     """Predict using Random Forest (requires feature engineering)"""
     try:
+        fingerprint = window_fingerprint(bundle, device_data)
+        cached = model_cache.get(device_name, fingerprint)
+        if cached is not None and cached['days_ahead'] == days_ahead:
+            return cached['result']
+
+        # Serve the device's own forest when the registry has one
+        model_info, feature_plan, model_source = serving_forest(bundle, device_name)
+
         # Prepare features
-        features_df = prepare_features_for_device(device_data)
-        
-        if features_df is None or len(features_df) == 0:
-            raise ValueError("Could not prepare features")
-        
-        # Get the latest complete record (no NaN values)
-        latest_features = features_df[feature_names].dropna()
-        
-        if len(latest_features) == 0:
-            raise ValueError("No complete feature records available")
-        
-        # Use the most recent complete record
-        X_pred = latest_features.tail(1)
-        
+        prepared = prepare_features_for_device(feature_plan, device_data)
+        X_pred = latest_feature_row(prepared)
+
         # Get the model
-        rf_model = best_model['model']
-        
+        rf_model = model_info['model']
+
         # Make prediction for current conditions
         current_prediction = rf_model.predict(X_pred)[0]
-        
-        # For ML models, we can't easily predict far into the future
-        # without future feature values, so we'll use a simple approach:
-        # assume gradual change based on current trends
-        
-        moisture_series = features_df['Soil Moisture'].dropna()
-        if len(moisture_series) > 5:
-            # Calculate recent trend
-            recent_trend = moisture_series.tail(5).diff().mean()
-        else:
-            recent_trend = 0
-        
-        # Generate forecast with trend
-        forecast_data = []
-        last_date = features_df.index[-1]
-        
-        for day in range(1, days_ahead + 1):
-            # Simple trend-based prediction
-            predicted_value = current_prediction + (recent_trend * day * 0.1)  # Damped trend
-            
-            # Ensure reasonable bounds
-            predicted_value = max(0, min(100, predicted_value))
-            
-            forecast_date = last_date + pd.Timedelta(days=day)
-            
-            forecast_data.append({
-                'day': day,
-                'date': forecast_date.isoformat(),
-                'predicted_moisture': round(float(predicted_value), 2)
-            })
-        
-        return {
-            'forecast': forecast_data,
-            'model_used': best_model_name,
-            'note': 'ML prediction with trend extrapolation (limited accuracy for long-term)',
-            'data_points_used': len(moisture_series)
-        }
+
+        result = build_ml_forecast(prepared[0], current_prediction, days_ahead, model_source)
+
+        # The forest itself is shared, so only the forecast is cached
+        model_cache.put(device_name, fingerprint, None, days_ahead, result)
+        return result
         
     except Exception as e:
         logger.error(f"ML prediction error for {device_name}: {e}")
         return None
 
+def predict_with_ml_batch(bundle, devices_data, days_ahead=30):
+    """Random Forest predictions for many devices with one predict call per forest.
+
+    Uncached devices are grouped by the forest serving them (the global best
+    or a device's own). Each group's features are built in one pass, its
+    latest complete rows are stacked into one matrix for rf_model.predict,
+    and the predictions are scattered back into per-device forecasts.
+    Returns {device_name: result or None} like predict_with_ml.
+    """
+    results = {}
+    fingerprints = {}
+
+    for device_name, device_data in devices_data.items():
+        fingerprints[device_name] = window_fingerprint(bundle, device_data)
+        cached = model_cache.get(device_name, fingerprints[device_name])
+        if cached is not None and cached['days_ahead'] == days_ahead:
+            results[device_name] = cached['result']
+
+    forest_groups = {}
+    for device_name, device_data in devices_data.items():
+        if device_name in results:
+            continue
+        model_info, feature_plan, model_source = serving_forest(bundle, device_name)
+        group = forest_groups.setdefault(id(model_info), (model_info, feature_plan, model_source, {}))
+        group[3][device_name] = device_data
+
+    for model_info, feature_plan, model_source, pending in forest_groups.values():
+        features_by_device = prepare_features_batch(feature_plan, pending)
+
+        # Collect the latest complete feature row of every device
+        rows = []
+        row_devices = []
+        for device_name, prepared in features_by_device.items():
+            try:
+                rows.append(latest_feature_row(prepared))
+                row_devices.append(device_name)
+            except Exception as e:
+                logger.error(f"ML prediction error for {device_name}: {e}")
+                results[device_name] = None
+
+        if not rows:
+            continue
+
+        try:
+            current_predictions = model_info['model'].predict(pd.concat(rows))
+        except Exception as e:
+            logger.error(f"Batched ML prediction failed: {e}")
+            current_predictions = [None] * len(row_devices)
+
+        for device_name, current_prediction in zip(row_devices, current_predictions):
+            if current_prediction is None:
+                results[device_name] = None
+                continue
+
+            try:
+                result = build_ml_forecast(features_by_device[device_name][0], current_prediction, days_ahead, model_source)
+                model_cache.put(device_name, fingerprints[device_name], None, days_ahead, result)
+                results[device_name] = result
+            except Exception as e:
+                logger.error(f"ML prediction error for {device_name}: {e}")
+                results[device_name] = None
+
+    return {device_name: results.get(device_name) for device_name in devices_data}
+
+def init_prediction_worker(version, started_queue):
+    """Worker pool initializer: load the models under the parent's version number"""
+    global _task_started_queue
+    _task_started_queue = started_queue
+    load_trained_models(version=version)
+
+class PredictionPool:
+    """Worker processes for one model version, shared by concurrent batch requests.
+
+    users counts the batches running on the pool. A pool that is retired
+    (newer models, a broken worker or a timed-out device) takes no new
+    batches and is shut down once its last batch finishes; only then are its
+    workers killed, so one request's timeout never cuts off another's devices.
+    """
+
+    def __init__(self, version):
+        # Spawned, not forked: the API process has threads (model watcher,
+        # request threads) that may hold locks the workers would need
+        context = multiprocessing.get_context('spawn')
+        self.version = version
+        self.started = context.Queue()
+        self.executor = ProcessPoolExecutor(
+            max_workers=BATCH_MAX_WORKERS,
+            mp_context=context,
+            initializer=init_prediction_worker,
+            initargs=(version, self.started)
+        )
+        self.users = 0
+        self.retired = False
+        self.kill = False
+        self.closed = False
+        self._starts = {}
+        self._starts_lock = threading.Lock()
+
+    def start_time(self, task_id):
+        """time.time() at which a worker started the task, None while it is queued"""
+        with self._starts_lock:
+            while True:
+                try:
+                    started_id, started_at = self.started.get_nowait()
+                except queue.Empty:
+                    break
+                self._starts[started_id] = started_at
+            return self._starts.get(task_id)
+
+    def forget(self, task_ids):
+        with self._starts_lock:
+            for task_id in task_ids:
+                self._starts.pop(task_id, None)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.kill:
+            # ProcessPoolExecutor has no public way to stop running tasks
+            for process in list((self.executor._processes or {}).values()):
+                process.terminate()
+        self.started.close()
+
+def acquire_pool(bundle):
+    """The worker pool for this model version, counted as in use until release_pool"""
+    global _prediction_pool
+
+    with _executor_lock:
+        pool = _prediction_pool
+        if pool is None or pool.version != bundle.version:
+            if pool is not None:
+                # Batches already running on it finish with the models they started with
+                _retire_pool(pool)
+            pool = _prediction_pool = PredictionPool(bundle.version)
+            logger.info(f"Started prediction worker pool with {BATCH_MAX_WORKERS} workers (model version {bundle.version})")
+        pool.users += 1
+        return pool
+
+def release_pool(pool, retire=False, kill=False):
+    """End one batch's use of pool.
+
+    retire stops new batches from using it (e.g. after a worker crashed);
+    kill also terminates its workers, for a timed-out task still holding one.
+    Either takes effect when the pool's last batch is done.
+    """
+    with _executor_lock:
+        pool.users -= 1
+        pool.kill = pool.kill or kill
+        if retire or kill or pool.retired:
+            _retire_pool(pool)
+
+def _retire_pool(pool):
+    """Take pool out of service, closing it once no batch uses it (caller holds _executor_lock)"""
+    global _prediction_pool
+
+    if _prediction_pool is pool:
+        _prediction_pool = None
+    pool.retired = True
+    if pool.users == 0:
+        pool.close()
+
+def predict_device_in_worker(task_id, device_name, device_info, days_ahead=30):
+    """predict_device with the bundle the pool worker loaded at startup"""
+    if _task_started_queue is not None:
+        _task_started_queue.put((task_id, time.time()))
+    if model_bundle is None:
+        return {'error': 'Models not loaded in worker', 'forecast': []}, 0.0
+    return predict_device(model_bundle, device_name, device_info, days_ahead)
+
+def predict_device(bundle, device_name, device_info, days_ahead=30):
+    """Predict one device of a batch request, returning (result, latency_ms)"""
+    start = time.perf_counter()
+
+    try:
+        recent_data = device_info.get('recent_data', [])
+        logger.info(f"Device '{device_name}' - recent_data count: {len(recent_data)}")
+
+        if not recent_data:
+            result = {
+                'error': 'No recent data provided',
+                'forecast': []
+            }
+        else:
+            # Make predictions based on the device's serving model type
+            model_name = bundle.serving_model_name(device_name)
+            if model_name in ['ARIMA', 'SARIMA']:
+                prediction_result = predict_with_arima_sarima(bundle, device_name, recent_data, days_ahead)
+            elif model_name == 'RandomForest':
+                prediction_result = predict_with_ml(bundle, device_name, recent_data, days_ahead)
+            else:
+                prediction_result = None
+
+            if prediction_result is None:
+                result = {
+                    'error': f'{model_name} prediction failed',
+                    'forecast': []
+                }
+            else:
+                result = prediction_result
+
+    except Exception as device_error:
+        logger.error(f"Error predicting for device {device_name}: {device_error}")
+        result = {
+            'error': str(device_error),
+            'forecast': []
+        }
+
+    return result, (time.perf_counter() - start) * 1000
+
+def run_batch_serial(bundle, devices_data, days_ahead):
+    """Predict every device one after another in this process"""
+    return {
+        device_name: predict_device(bundle, device_name, device_info, days_ahead)
+        for device_name, device_info in devices_data.items()
+    }
+
+def run_batch_ml(bundle, devices_data, days_ahead):
+    """Predict every device with one stacked Random Forest call"""
+    start = time.perf_counter()
+
+    outcomes = {}
+    ready = {}
+    for device_name, device_info in devices_data.items():
+        recent_data = device_info.get('recent_data', []) if isinstance(device_info, dict) else None
+        if recent_data:
+            ready[device_name] = recent_data
+        elif recent_data is None:
+            outcomes[device_name] = {'error': 'Invalid device entry', 'forecast': []}
+        else:
+            outcomes[device_name] = {'error': 'No recent data provided', 'forecast': []}
+
+    for device_name, prediction_result in predict_with_ml_batch(bundle, ready, days_ahead).items():
+        if prediction_result is None:
+            outcomes[device_name] = {'error': 'RandomForest prediction failed', 'forecast': []}
+        else:
+            outcomes[device_name] = prediction_result
+
+    # Devices share one pass, so each is charged an equal share of it
+    latency = (time.perf_counter() - start) * 1000 / max(len(devices_data), 1)
+    return {device_name: (outcomes[device_name], latency) for device_name in devices_data}
+
+def run_batch_parallel(bundle, devices_data, days_ahead, device_timeout):
+    """Fan the devices out over the worker pool with a per-device timeout.
+
+    Each device's timeout counts from when a worker starts it, so devices
+    queued behind other requests' tasks are not cut short. A device that
+    times out keeps running in its worker, so the pool is retired and its
+    workers killed once no batch uses it any more.
+    """
+    pool = acquire_pool(bundle)
+    start = time.perf_counter()
+
+    outcomes = {}
+    futures = {}
+    task_ids = {}
+    fingerprints = {}
+    pool_broken = False
+    timed_out = False
+
+    try:
+        for device_name, device_info in devices_data.items():
+            # Answer unchanged windows from this process's cache without a worker round-trip
+            recent_data = device_info.get('recent_data') if isinstance(device_info, dict) else None
+            if recent_data:
+                fingerprints[device_name] = window_fingerprint(bundle, recent_data)
+                cached = model_cache.get(device_name, fingerprints[device_name])
+                if cached is not None and cached['days_ahead'] == days_ahead:
+                    outcomes[device_name] = (cached['result'], (time.perf_counter() - start) * 1000)
+                    continue
+
+            task_ids[device_name] = next(_task_ids)
+            futures[device_name] = pool.executor.submit(
+                predict_device_in_worker, task_ids[device_name], device_name, device_info, days_ahead
+            )
+
+        pending = dict(futures)
+        while pending:
+            wait(list(pending.values()), timeout=BATCH_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+
+            for device_name, future in list(pending.items()):
+                if future.done():
+                    del pending[device_name]
+                    try:
+                        outcomes[device_name] = future.result()
+
+                        result = outcomes[device_name][0]
+                        if 'error' not in result and device_name in fingerprints:
+                            model_cache.put(device_name, fingerprints[device_name], None, days_ahead, result)
+                    except Exception as pool_error:
+                        # A crashed worker breaks the whole pool; report it per device
+                        pool_broken = True
+                        logger.error(f"Worker failed for device {device_name}: {pool_error}")
+                        outcomes[device_name] = (
+                            {'error': f'Worker failed: {pool_error}', 'forecast': []},
+                            (time.perf_counter() - start) * 1000
+                        )
+                    continue
+
+                started_at = pool.start_time(task_ids[device_name])
+                if started_at is not None and time.time() - started_at > device_timeout:
+                    del pending[device_name]
+                    timed_out = True
+                    logger.error(f"Prediction for device {device_name} timed out after {device_timeout}s")
+                    outcomes[device_name] = (
+                        {'error': f'Prediction timed out after {device_timeout}s', 'forecast': []},
+                        (time.perf_counter() - start) * 1000
+                    )
+    finally:
+        pool.forget(task_ids.values())
+        release_pool(pool, retire=pool_broken, kill=timed_out)
+
+    # Keep the request's device order in the response
+    return {device_name: outcomes[device_name] for device_name in devices_data}
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    bundle = model_bundle
     return jsonify({
         'status': 'healthy',
-        'model_loaded': model_loaded,
-        'best_model': best_model_name,
+        'model_loaded': bundle is not None,
+        'best_model': bundle.best_model_name if bundle else None,
+        'model_version': bundle.version if bundle else None,
         'timestamp': datetime.now().isoformat()
     })
 
 @app.route('/model/info', methods=['GET'])
 def model_info():
     """Get information about the loaded models"""
-    if not model_loaded:
+    bundle = model_bundle
+    if bundle is None:
         return jsonify({'error': 'No models loaded'}), 404
     
+    # Answered from the manifest, so no model file is read for it
     models_info = {}
-    for model_name, model_data_item in model_data.get('models', {}).items():
+    for model_name, entry in bundle.manifest.get('models', {}).items():
+        info = entry.get('info', {})
         if model_name == 'ARIMA':
             models_info[model_name] = {
-                'order': model_data_item.get('order'),
-                'is_stationary': model_data_item.get('is_stationary')
+                'order': info.get('order'),
+                'is_stationary': info.get('is_stationary')
             }
         elif model_name == 'SARIMA':
             models_info[model_name] = {
-                'order': model_data_item.get('order'),
-                'seasonal_order': model_data_item.get('seasonal_order'),
-                'seasonal_period': model_data_item.get('seasonal_period'),
-                'aic': model_data_item.get('aic')
+                'order': info.get('order'),
+                'seasonal_order': info.get('seasonal_order'),
+                'seasonal_period': info.get('seasonal_period'),
+                'aic': info.get('aic')
             }
         elif model_name == 'RandomForest':
             models_info[model_name] = {
-                'cv_score': model_data_item.get('cv_score'),
-                'n_features': len(model_data_item.get('feature_names', [])),
-                'top_features': model_data_item.get('feature_importance', pd.DataFrame()).head(5).to_dict('records') if 'feature_importance' in model_data_item else []
+                'cv_score': info.get('cv_score'),
+                'n_features': info.get('n_features', 0),
+                'top_features': info.get('top_features', [])
             }
     
     return jsonify({
-        'models_available': list(model_data.get('models', {}).keys()),
-        'best_model': best_model_name,
-        'training_timestamp': model_data.get('training_timestamp'),
+        'models_available': list(bundle.manifest.get('models', {}).keys()),
+        'best_model': bundle.best_model_name,
+        'model_version': bundle.version,
+        'training_timestamp': bundle.manifest.get('training_timestamp'),
         'models_info': models_info
     })
 
@@ -305,11 +926,22 @@ def predict_moisture_batch():
     """
     Predict moisture levels for multiple devices using the best trained model
     """
-    if not model_loaded:
+    # Hold one bundle for the whole request, even if a reload swaps it meanwhile
+    bundle = model_bundle
+    if bundle is None:
         return jsonify({'error': 'No models loaded. Please run training script first.'}), 500
 
     try:
-        data = request.get_json()
+        # Rows or JSON-columnar as JSON, or a msgpack/Arrow body (see wire_format)
+        try:
+            if request.mimetype in wire_format.MSGPACK_TYPES + wire_format.ARROW_TYPES:
+                data = wire_format.parse_batch_request(request.mimetype, request.get_data(), request.args)
+            else:
+                data = request.get_json()
+                if data:
+                    wire_format.decode_columnar_devices(data)
+        except (ValueError, TypeError) as decode_error:
+            return jsonify({'error': f'Could not decode request: {decode_error}'}), 400
 
         if not data or 'devices' not in data:
             return jsonify({'error': 'devices data is required'}), 400
@@ -318,44 +950,53 @@ def predict_moisture_batch():
         days_ahead = data.get('days_ahead', 30)
 
         logger.info(f"Batch prediction request for {len(devices_data)} devices, days_ahead={days_ahead}")
-        logger.info(f"Using best model: {best_model_name}")
+        logger.info(f"Using best model: {bundle.best_model_name} (version {bundle.version})")
 
-        results = {}
+        execution_mode = data.get('execution_mode', BATCH_EXECUTION_MODE)
+        # Batches share one pool of BATCH_MAX_WORKERS processes; a request's
+        # max_workers is capped to it and only max_workers=1 (serial) changes anything
+        max_workers = min(max(1, int(data.get('max_workers', BATCH_MAX_WORKERS))), BATCH_MAX_WORKERS)
+        device_timeout = float(data.get('device_timeout', BATCH_DEVICE_TIMEOUT))
+        response_format = data.get('response_format', 'rows')
 
-        for device_name, device_info in devices_data.items():
-            try:
-                recent_data = device_info.get('recent_data', [])
-                logger.info(f"Device '{device_name}' - recent_data count: {len(recent_data)}")
-
-                if not recent_data:
-                    results[device_name] = {
-                        'error': 'No recent data provided',
-                        'forecast': []
-                    }
-                    continue
+        if execution_mode not in ['serial', 'parallel']:
+            return jsonify({'error': f'Unknown execution_mode: {execution_mode}'}), 400
+        if response_format not in RESPONSE_FORMATS:
+            return jsonify({'error': f'response_format must be one of {RESPONSE_FORMATS}'}), 400
 
-                # Make predictions based on best model type
-                if best_model_name in ['ARIMA', 'SARIMA']:
-                    prediction_result = predict_with_arima_sarima(device_name, recent_data, days_ahead)
-                elif best_model_name == 'RandomForest':
-                    prediction_result = predict_with_ml(device_name, recent_data, days_ahead)
-                else:
-                    prediction_result = None
-
-                if prediction_result is None:
-                    results[device_name] = {
-                        'error': f'{best_model_name} prediction failed',
-                        'forecast': []
-                    }
-                else:
-                    results[device_name] = prediction_result
-
-            except Exception as device_error:
-                logger.error(f"Error predicting for device {device_name}: {device_error}")
-                results[device_name] = {
-                    'error': str(device_error),
-                    'forecast': []
-                }
+        # Forest devices are batched into one predict call in this process;
+        # the rest (state-space or unknown models) go through predict_device
+        ml_devices = {
+            device_name: device_info for device_name, device_info in devices_data.items()
+            if bundle.serving_model_name(device_name) == 'RandomForest'
+        }
+        other_devices = {
+            device_name: device_info for device_name, device_info in devices_data.items()
+            if device_name not in ml_devices
+        }
+
+        # A single device is not worth the pool round-trip
+        if len(other_devices) <= 1 or max_workers == 1:
+            execution_mode = 'serial'
+
+        logger.info(f"Execution mode: {execution_mode} (workers={BATCH_MAX_WORKERS if execution_mode == 'parallel' else 1}, device_timeout={device_timeout}s)")
+
+        batch_start = time.perf_counter()
+
+        outcomes = {}
+        if ml_devices:
+            # One vectorized feature pass and one predict call for all devices
+            outcomes.update(run_batch_ml(bundle, ml_devices, days_ahead))
+        if other_devices and execution_mode == 'parallel':
+            outcomes.update(run_batch_parallel(bundle, other_devices, days_ahead, device_timeout))
+        elif other_devices:
+            outcomes.update(run_batch_serial(bundle, other_devices, days_ahead))
+        outcomes = {device_name: outcomes[device_name] for device_name in devices_data}
+
+        wall_time_ms = (time.perf_counter() - batch_start) * 1000
+
+        results = {device_name: format_prediction(result, response_format) for device_name, (result, _) in outcomes.items()}
+        device_latency_ms = {device_name: round(latency, 1) for device_name, (_, latency) in outcomes.items()}
 
         # Calculate success rate
         successful_predictions = sum(1 for result in results.values() if 'error' not in result)
@@ -371,7 +1012,13 @@ def predict_moisture_batch():
                 'devices_processed': len(devices_data),
                 'successful_predictions': successful_predictions,
                 'success_rate': f"{success_rate:.1%}",
-                'model_used': best_model_name
+                'model_used': bundle.best_model_name,
+                'model_version': bundle.version,
+                'execution_mode': execution_mode,
+                'response_format': response_format,
+                'max_workers': BATCH_MAX_WORKERS if execution_mode == 'parallel' else 1,
+                'wall_time_ms': round(wall_time_ms, 1),
+                'device_latency_ms': device_latency_ms
             }
         })
 
@@ -385,7 +1032,8 @@ def predict_moisture_single():
     """
     Predict moisture for a single device
     """
-    if not model_loaded:
+    bundle = model_bundle
+    if bundle is None:
         return jsonify({'error': 'No models loaded'}), 500
 
     try:
@@ -397,27 +1045,34 @@ def predict_moisture_single():
         device_name = data['device_name']
         recent_data = data['recent_data']
         days_ahead = data.get('days_ahead', 30)
+        response_format = data.get('response_format', 'rows')
+
+        if response_format not in RESPONSE_FORMATS:
+            return jsonify({'error': f'response_format must be one of {RESPONSE_FORMATS}'}), 400
 
         logger.info(f"Single prediction for device: {device_name}")
 
         # Make prediction
-        if best_model_name in ['ARIMA', 'SARIMA']:
-            prediction_result = predict_with_arima_sarima(device_name, recent_data, days_ahead)
-        elif best_model_name == 'RandomForest':
-            prediction_result = predict_with_ml(device_name, recent_data, days_ahead)
+        model_name = bundle.serving_model_name(device_name)
+        if model_name in ['ARIMA', 'SARIMA']:
+            prediction_result = predict_with_arima_sarima(bundle, device_name, recent_data, days_ahead)
+        elif model_name == 'RandomForest':
+            prediction_result = predict_with_ml(bundle, device_name, recent_data, days_ahead)
         else:
-            return jsonify({'error': f'Unknown model type: {best_model_name}'}), 500
+            return jsonify({'error': f'Unknown model type: {model_name}'}), 500
 
         if prediction_result is None:
             return jsonify({'error': 'Prediction failed'}), 500
 
         return jsonify({
             'device_name': device_name,
-            'prediction': prediction_result,
+            'prediction': format_prediction(prediction_result, response_format),
             'metadata': {
                 'prediction_timestamp': datetime.now().isoformat(),
-                'model_used': best_model_name,
-                'days_predicted': days_ahead
+                'model_used': model_name,
+                'model_version': bundle.version,
+                'days_predicted': days_ahead,
+                'response_format': response_format
             }
         })
 
@@ -425,72 +1080,184 @@ def predict_moisture_single():
         logger.error(f"Error in single prediction: {str(e)}")
         return jsonify({'error': f'Single prediction failed: {str(e)}'}), 500
 
+def run_full_retrain(job):
+    """Retrain job: run the training script in a subprocess, then reload"""
+    job.set_progress(0.0, 'Starting training script')
+
+    job.process = subprocess.Popen(
+        [sys.executable, '-u', 'train_and_save.py'],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    # A cancel that arrived before the process existed had nothing to terminate
+    if job.cancel_event.is_set():
+        job.process.terminate()
+
+    timed_out = threading.Event()
+    def kill_on_timeout():
+        timed_out.set()
+        job.process.kill()
+
+    timer = threading.Timer(RETRAIN_TIMEOUT, kill_on_timeout)
+    timer.start()
+    try:
+        for line in job.process.stdout:
+            job.log(line)
+        returncode = job.process.wait()
+    finally:
+        timer.cancel()
+
+    if returncode != 0:
+        if job.cancel_event.is_set():
+            raise JobCancelled()
+        if timed_out.is_set():
+            raise TimeoutError(f'Training timeout (>{RETRAIN_TIMEOUT / 60:.0f} minutes)')
+        raise RuntimeError(f'Training script exited with code {returncode}')
+
+    # The script saved the new models (the model watchers will serve them),
+    # so a late cancel no longer applies. Predictions used the old models
+    # until this reload
+    job.end_cancellable()
+    job.set_progress(0.95, 'Loading new models')
+    bundle = load_trained_models()
+
+    return {'new_best_model': bundle.best_model_name if bundle else None}
+
+def run_incremental_update(job):
+    """Retrain job: fold new readings into the saved models, then reload"""
+    from train_and_save import fetch_new_readings, incremental_update
+
+    job.set_progress(0.0, 'Loading saved models')
+    # Work on a private in-memory copy so in-flight predictions keep the served objects
+    updated_data, _ = model_store.load_model_data(MODEL_STORE_DIR, MODEL_PATH, mmap_mode=None)
+
+    job.set_progress(0.05, 'Fetching readings since the last training')
+    context_df, new_df = fetch_new_readings(updated_data)
+
+    if new_df is None or len(new_df) == 0:
+        return {'new_readings': 0}
+
+    incremental_update(
+        updated_data, new_df,
+        progress=lambda fraction, message: job.set_progress(0.1 + 0.8 * fraction, message),
+        context_df=context_df
+    )
+
+    job.set_progress(0.9, 'Saving updated models')
+    # Once saving starts the new models will be served, so the job must finish
+    if job.end_cancellable():
+        raise JobCancelled()
+    model_store.save_model_store(updated_data, MODEL_STORE_DIR)
+    bundle = load_trained_models()
+
+    return {'new_readings': len(new_df), 'new_best_model': bundle.best_model_name if bundle else None}
+
+retrain_jobs = RetrainJobQueue({
+    'full': run_full_retrain,
+    'incremental': run_incremental_update
+})
+
+def use_retrain_owner(address, authkey):
+    """Send this process's retrain requests to the job queue of retrain_owner.py.
+
+    serve.py runs the jobs there so that every gunicorn worker sees the
+    same jobs and recycling a worker never kills a running retrain.
+    """
+    global retrain_jobs
+    retrain_jobs = connect_job_queue(address, authkey)
+
 @app.route('/retrain', methods=['POST'])
 def trigger_retrain():
     """
-    Endpoint to trigger model retraining (calls the training script)
+    Queue a retraining job and return its id immediately.
+
+    mode='full' (default) runs the training script; mode='incremental'
+    updates the models with the readings since the last training. A mode
+    that is already queued or running returns the existing job.
     """
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode', 'full')
+
+    if mode == 'incremental' and model_bundle is None:
+        return jsonify({'error': 'No models loaded to update'}), 500
+
     try:
-        import subprocess
-        import sys
-        
-        logger.info("Starting model retraining...")
-        
-        # Run the training script
-        result = subprocess.run([sys.executable, 'train_models.py'], 
-                              capture_output=True, text=True, timeout=1800)  # 30 min timeout
-        
-        if result.returncode == 0:
-            # Reload models after successful training
-            load_trained_models()
-            
-            return jsonify({
-                'status': 'success',
-                'message': 'Models retrained successfully',
-                'new_best_model': best_model_name,
-                'timestamp': datetime.now().isoformat()
-            })
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': 'Training failed',
-                'error': result.stderr,
-                'timestamp': datetime.now().isoformat()
-            }), 500
-            
-    except subprocess.TimeoutExpired:
-        return jsonify({
-            'status': 'error',
-            'message': 'Training timeout (>30 minutes)',
-            'timestamp': datetime.now().isoformat()
-        }), 500
-    except Exception as e:
-        logger.error(f"Retrain error: {e}")
-        return jsonify({
-            'status': 'error',
-            'message': f'Retrain failed: {str(e)}',
-            'timestamp': datetime.now().isoformat()
-        }), 500
+        job, deduplicated = retrain_jobs.submit(mode)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    logger.info(f"Retrain job {job['job_id']} ({mode}) {'already active' if deduplicated else 'queued'}")
+
+    response = dict(job)
+    response.update({
+        'deduplicated': deduplicated,
+        'status_url': f"/retrain/{job['job_id']}",
+        'log_url': f"/retrain/{job['job_id']}/log"
+    })
+    return jsonify(response), 202
+
+@app.route('/retrain', methods=['GET'])
+def list_retrain_jobs():
+    """Recent retraining jobs, newest first"""
+    return jsonify({'jobs': retrain_jobs.list()})
+
+@app.route('/retrain/<job_id>', methods=['GET'])
+def retrain_job_status(job_id):
+    """Status and progress of one retraining job"""
+    job = retrain_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(job)
+
+@app.route('/retrain/<job_id>/log', methods=['GET'])
+def retrain_job_log(job_id):
+    """Last lines of a retraining job's log (?tail=N, default 50)"""
+    job = retrain_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+
+    tail = request.args.get('tail', 50, type=int)
+    return jsonify({'job_id': job_id, 'status': job['status'], 'lines': retrain_jobs.log_tail(job_id, tail)})
+
+@app.route('/retrain/<job_id>/cancel', methods=['POST'])
+def cancel_retrain_job(job_id):
+    """Cancel a queued or running retraining job"""
+    job = retrain_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    if job['status'] not in ['queued', 'running']:
+        return jsonify({'error': f"Job already {job['status']}", 'job': job}), 409
+
+    job = retrain_jobs.cancel(job_id)
+    if job['status'] == 'running' and not job['cancellable']:
+        return jsonify({'error': 'Job is saving its results and can no longer be cancelled', 'job': job}), 409
+    return jsonify(job), 202
 
 @app.route('/model/stats', methods=['GET'])
 def get_model_stats():
     """Get detailed statistics about the current models"""
-    if not model_loaded:
+    bundle = model_bundle
+    if bundle is None:
         return jsonify({'error': 'No models loaded'}), 404
     
     try:
         stats = {
-            'best_model': best_model_name,
-            'training_date': model_data.get('training_timestamp'),
-            'models_count': len(model_data.get('models', {})),
-            'available_models': list(model_data.get('models', {}).keys())
+            'best_model': bundle.best_model_name,
+            'model_version': bundle.version,
+            'loaded_at': bundle.loaded_at,
+            'training_date': bundle.manifest.get('training_timestamp'),
+            'models_count': len(bundle.manifest.get('models', {})),
+            'available_models': list(bundle.manifest.get('models', {}).keys())
         }
         
         # Add model-specific stats
-        if best_model_name == 'RandomForest' and feature_names:
+        feature_names = bundle.feature_names
+        if bundle.best_model_name == 'RandomForest' and feature_names:
             stats['feature_count'] = len(feature_names)
             stats['top_features'] = feature_names[:10] if len(feature_names) > 10 else feature_names
-        
+
+        stats['cache'] = model_cache.stats()
+        stats['device_models'] = len([entry for entry in bundle.device_registry.values() if 'file' in entry])
+
         return jsonify(stats)
         
     except Exception as e:
@@ -505,9 +1272,9 @@ if __name__ == '__main__':
     print("📦 Loading pre-trained models...")
     load_trained_models()
     
-    if model_loaded:
+    if model_bundle is not None:
         print(f"✅ Models loaded successfully!")
-        print(f"🏆 Best model: {best_model_name}")
+        print(f"🏆 Best model: {model_bundle.best_model_name}")
         print(f"🔧 Available endpoints:")
         print("   - GET  /health")
         print("   - GET  /model/info")
@@ -515,14 +1282,21 @@ if __name__ == '__main__':
         print("   - POST /predict/moisture/batch")
         print("   - POST /predict/moisture/single")
         print("   - POST /retrain")
+        print("   - GET  /retrain/<job_id>")
+        print("   - GET  /retrain/<job_id>/log")
+        print("   - POST /retrain/<job_id>/cancel")
     else:
         print("❌ Failed to load models!")
         print("💡 Please run the training script first:")
-        print("   python train_models.py")
+        print("   python train_and_save.py")
     
     print("=" * 50)
+
+    # Pick up models rewritten by the training scripts without a restart
+    start_model_watcher()
     
-    # Run the Flask app
+    # Development server; use serve.py for multi-process production serving
+    print("💡 For production: python serve.py")
     app.run(
         host='0.0.0.0',
         port=5000,
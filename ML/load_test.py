@@ -0,0 +1,107 @@
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+
+import wire_format
+
+def make_batch_payload(n_devices, n_readings, days_ahead, seed=0):
+    """Synthetic batch request shaped like the dashboard's payload"""
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range(end=pd.Timestamp.now().floor('h'), periods=n_readings, freq='h').strftime('%Y-%m-%dT%H:%M:%S')
+
+    devices = {}
+    for i in range(n_devices):
+        moisture = 40 + 10 * np.sin(np.arange(n_readings) * 2 * np.pi / 24 + i) + rng.normal(0, 1, n_readings)
+        devices[f'device-{i}'] = {
+            'recent_data': [
+                {
+                    'devicetimestamp': timestamps[j],
+                    'moisture': round(float(moisture[j]), 2),
+                    'temperature': round(float(25 + rng.normal()), 2),
+                    'npk_n': round(float(10 + rng.normal()), 2),
+                    'npk_p': round(float(5 + rng.normal()), 2),
+                    'npk_k': round(float(8 + rng.normal()), 2)
+                }
+                for j in range(n_readings)
+            ]
+        }
+    return {'devices': devices, 'days_ahead': days_ahead}
+
+def encode_payload(payload, encoding):
+    """(body, content type) of a batch payload in the given request encoding"""
+    if encoding == 'columnar':
+        return json.dumps(wire_format.encode_columnar_json(payload)), 'application/json'
+    if encoding == 'msgpack':
+        return wire_format.encode_msgpack(payload), 'application/msgpack'
+    if encoding == 'arrow':
+        return wire_format.encode_arrow(payload), 'application/vnd.apache.arrow.stream'
+    return json.dumps(payload), 'application/json'
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the batch prediction endpoint")
+    parser.add_argument('--url', default='http://localhost:5000/predict/moisture/batch')
+    parser.add_argument('--requests', type=int, default=200, help='total requests to send')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+    parser.add_argument('--devices', type=int, default=10, help='devices per request')
+    parser.add_argument('--readings', type=int, default=48, help='readings per device')
+    parser.add_argument('--days-ahead', type=int, default=30)
+    parser.add_argument('--variants', type=int, default=20,
+                        help='distinct payloads to rotate through (more variants = fewer cache hits)')
+    parser.add_argument('--encoding', choices=['rows', 'columnar', 'msgpack', 'arrow'], default='rows',
+                        help='request body encoding (see wire_format.py)')
+    args = parser.parse_args()
+
+    print("🚀 BATCH ENDPOINT LOAD TEST")
+    print("=" * 60)
+    print(f"🎯 {args.url}")
+    print(f"📦 {args.requests} requests, {args.concurrency} concurrent, "
+          f"{args.devices} devices x {args.readings} readings, {args.variants} payload variants, "
+          f"{args.encoding} encoding")
+
+    payloads = [
+        encode_payload(make_batch_payload(args.devices, args.readings, args.days_ahead, seed=seed), args.encoding)
+        for seed in range(args.variants)
+    ]
+    url = args.url
+    if args.encoding == 'arrow':
+        # Arrow bodies carry only the readings; the options go in the query string
+        url += f"?days_ahead={args.days_ahead}"
+    session_pool = [requests.Session() for _ in range(args.concurrency)]
+
+    def send(i):
+        session = session_pool[i % args.concurrency]
+        start = time.perf_counter()
+        try:
+            body, content_type = payloads[i % len(payloads)]
+            response = session.post(url, data=body, headers={'Content-Type': content_type}, timeout=600)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return (time.perf_counter() - start) * 1000, ok
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(send, range(args.requests)))
+    wall_time = time.perf_counter() - wall_start
+
+    latencies = np.array([latency for latency, ok in outcomes if ok])
+    errors = sum(1 for _, ok in outcomes if not ok)
+
+    print("-" * 60)
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"⏱️  p50: {p50:8.1f} ms")
+        print(f"⏱️  p95: {p95:8.1f} ms")
+        print(f"⏱️  p99: {p99:8.1f} ms")
+        print(f"⏱️  max: {latencies.max():8.1f} ms")
+    print(f"📈 Throughput: {args.requests / wall_time:.1f} req/s "
+          f"({args.requests * args.devices / wall_time:.1f} devices/s)")
+    print(f"{'❌' if errors else '✅'} Errors: {errors}/{args.requests}")
+
+if __name__ == "__main__":
+    main()
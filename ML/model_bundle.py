@@ -0,0 +1,113 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+# Model types a device's own registry entry can serve
+DEVICE_MODEL_TYPES = ['ARIMA', 'SARIMA', 'RandomForest']
+
+
+def file_signature(paths):
+    """(path, mtime_ns, size) for each path, None for missing files"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """Everything a prediction needs from one load of the model artifacts.
+
+    The API swaps bundles with a single reference assignment, so a request
+    that grabbed a bundle keeps a consistent model name, model and feature
+    list even if a reload happens while it runs.
+    """
+    version: int
+    model_data: dict
+    manifest: dict
+    best_model_name: str
+    best_model: dict
+    feature_names: list
+    # How to compute feature_names from the readings (a FeaturePlan)
+    feature_plan: object = None
+    device_registry: dict = field(default_factory=dict)
+    registry_dir: str = 'models/devices'
+    source_signature: tuple = ()
+    loaded_at: str = ''
+    # Per-device model files, filled lazily on first use
+    device_models: dict = field(default_factory=dict)
+
+    def serving_model_name(self, device_name):
+        """Model type that serves this device: its own best model or the global best"""
+        entry = self.device_registry.get(device_name, {})
+        if 'file' in entry and entry.get('best_model_name') in DEVICE_MODEL_TYPES:
+            return entry['best_model_name']
+        return self.best_model_name
+
+    def get_device_model(self, device_name):
+        """The device's own pre-fitted (model_name, model_info), or None"""
+        entry = self.device_registry.get(device_name, {})
+        if 'file' not in entry or entry.get('best_model_name') not in DEVICE_MODEL_TYPES:
+            return None
+
+        if device_name not in self.device_models:
+            try:
+                self.device_models[device_name] = joblib.load(os.path.join(self.registry_dir, entry['file']))
+            except Exception as e:
+                logger.error(f"❌ Failed to load model for device {device_name}: {e}")
+                self.device_models[device_name] = None
+
+        device_model_data = self.device_models[device_name]
+        if device_model_data is None:
+            return None
+        return entry['best_model_name'], device_model_data['models'][entry['best_model_name']]
+
+
+class ArtifactWatcher:
+    """Background thread that reloads models when their files change on disk.
+
+    signature_fn returns the current on-disk signature and loaded_signature_fn
+    the signature of the loaded bundle. A change is acted on once it has been
+    stable for one poll, so half-written files are not picked up.
+    """
+
+    def __init__(self, signature_fn, loaded_signature_fn, on_change, interval=5.0):
+        self.signature_fn = signature_fn
+        self.loaded_signature_fn = loaded_signature_fn
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        previous = self.signature_fn()
+        while not self._stop.wait(self.interval):
+            current = self.signature_fn()
+            if current == previous and current != self.loaded_signature_fn():
+                logger.info("🔄 Model artifacts changed on disk, reloading")
+                try:
+                    self.on_change()
+                except Exception as e:
+                    logger.error(f"❌ Model reload failed: {e}")
+                    time.sleep(self.interval)
+            previous = current
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def estimate_size(value):
+    """Approximate in-memory size of a cache entry's contents, in bytes.
+
+    Arrays count their buffer (nbytes); dicts, lists and tuples are walked.
+    Much cheaper than pickling, and close enough for the byte budget.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class DeviceModelCache:
+    """In-process LRU cache of each device's forecast state and last forecast.
+
+    Entries hold small values (a forecast path array, a response dict),
+    never whole fitted models, so many devices fit in the byte budget.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=256 * 1024 * 1024, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def fingerprint(device_data):
+        """Stable hash of a device's recent data window"""
+        payload = json.dumps(device_data, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def get(self, device_name, fingerprint):
+        """Return the cached entry for this device/window, or None"""
+        key = (device_name, fingerprint)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if time.monotonic() - entry['created'] > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, device_name, fingerprint, model_state, days_ahead, result):
+        """Store a device's forecast state (may be None) and the forecast it produced"""
+        key = (device_name, fingerprint)
+        size = estimate_size(model_state) + estimate_size(result)
+
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = {
+                'model': model_state,
+                'days_ahead': days_ahead,
+                'result': result,
+                'size': size,
+                'created': time.monotonic()
+            }
+            self._bytes += size
+
+            # Evict least recently used entries until both budgets are met
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+        return True
+
+    def clear(self):
+        """Drop every entry (e.g. after the models were reloaded)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Counters and current usage for the /model/stats endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry['size']
@@ -0,0 +1,270 @@
+import json
+import os
+import pickle
+import threading
+import uuid
+from collections.abc import MutableMapping
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Split artifact layout written by train_and_save.py:
+#   models/optimal_moisture_models/manifest.json    best model, features, per-model metadata
+#   models/optimal_moisture_models/<Model>-<id>.joblib   one uncompressed file per model
+# MODEL_STORE_DIR in the environment moves the store for every script
+MODEL_STORE_DIR = os.environ.get('MODEL_STORE_DIR', 'models/optimal_moisture_models')
+# Single-file artifact written by older versions of the training script
+LEGACY_MODEL_PATH = 'models/optimal_moisture_models.pkl'
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_VERSION = 1
+
+# Metadata copied from each model dict into the manifest
+MODEL_INFO_KEYS = [
+    'order', 'seasonal_order', 'seasonal_period', 'aic', 'is_stationary',
+    'cv_score', 'feature_names', 'train_mean', 'train_std', 'search_report', 'timing', 'slim_report'
+]
+
+# Kalman filter/smoother objects statsmodels caches on the state space model;
+# they are rebuilt on the next filter call
+STATE_SPACE_CACHES = ['_representations', '_statespaces', '_kalman_filters', '_kalman_smoothers', '_simulators']
+SLIM_CHECK_STEPS = 48
+
+
+def manifest_path(store_dir=MODEL_STORE_DIR):
+    return os.path.join(store_dir, MANIFEST_NAME)
+
+
+def _json_safe(value):
+    """value converted to plain JSON types, or None if it has no JSON form"""
+    if isinstance(value, (str, bool)) or value is None:
+        return value
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return value.item() if isinstance(value, np.generic) else value
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _json_safe(item) for key, item in value.items()}
+    return None
+
+
+def describe_model(model_info):
+    """Manifest metadata of one model dict (no fitted objects)"""
+    info = {key: _json_safe(model_info[key]) for key in MODEL_INFO_KEYS if key in model_info}
+
+    if 'feature_importance' in model_info:
+        info['top_features'] = _json_safe(model_info['feature_importance'].head(5).to_dict('records'))
+    if 'feature_names' in model_info:
+        info['n_features'] = len(model_info['feature_names'])
+    return info
+
+
+def slim_state_space_results(results):
+    """Copy of fitted ARIMA/SARIMA results with only what forecasting needs.
+
+    Re-filtering with the fitted params in low_memory mode keeps the params,
+    the final state and the training series (needed by apply/append), but
+    not the per-observation smoothed states, covariances and fit details.
+    """
+    slim = results.model.filter(results.params, low_memory=True)
+    for cache in STATE_SPACE_CACHES:
+        if isinstance(getattr(slim.model.ssm, cache, None), dict):
+            getattr(slim.model.ssm, cache).clear()
+    return slim
+
+
+def slim_model_info(model_name, model_info):
+    """Replace a state-space model dict's results by slimmed ones, in place.
+
+    The slimmed results are only kept if their forecasts match the full
+    results; the sizes and the check are recorded under 'slim_report'.
+    """
+    results = model_info.get('model')
+    if results is None or not hasattr(results, 'model') or not hasattr(results.model, 'ssm'):
+        return model_info
+
+    try:
+        slim = slim_state_space_results(results)
+        bytes_before = len(pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL))
+        bytes_after = len(pickle.dumps(slim, protocol=pickle.HIGHEST_PROTOCOL))
+
+        full_forecast = np.asarray(results.forecast(SLIM_CHECK_STEPS))
+        slim_forecast = np.asarray(slim.forecast(SLIM_CHECK_STEPS))
+        forecasts_match = bool(np.allclose(full_forecast, slim_forecast))
+    except Exception as e:
+        print(f"⚠️ Could not slim {model_name}: {e}")
+        return model_info
+
+    model_info['slim_report'] = {
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after if forecasts_match else bytes_before,
+        'forecast_max_abs_diff': float(np.max(np.abs(full_forecast - slim_forecast))),
+        'forecasts_match': forecasts_match
+    }
+
+    if forecasts_match:
+        model_info['model'] = slim
+        print(f"🪶 {model_name}: {bytes_before / 1e6:.2f} MB -> {bytes_after / 1e6:.2f} MB")
+    else:
+        print(f"⚠️ {model_name}: slimmed forecasts differ, keeping the full results")
+
+    return model_info
+
+
+def build_manifest(model_data, files=None):
+    """Manifest for model_data; files maps model name to its file name"""
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'models': {}
+    }
+
+    # Small top-level entries (best model name, timestamps, evaluation results, ...)
+    for key, value in model_data.items():
+        if key in ['models', 'best_model']:
+            continue
+        safe_value = _json_safe(value)
+        if safe_value is not None:
+            manifest[key] = safe_value
+
+    models = model_data['models']
+    for model_name in models:
+        if isinstance(models, LazyModels) and not models.is_loaded(model_name):
+            manifest['models'][model_name] = {'info': models.entries[model_name].get('info', {})}
+        else:
+            manifest['models'][model_name] = {'info': describe_model(models[model_name])}
+        if files and model_name in files:
+            manifest['models'][model_name]['file'] = files[model_name]
+
+    return manifest
+
+
+def read_manifest(store_dir=MODEL_STORE_DIR):
+    """The store's manifest, or None if there is no split artifact"""
+    try:
+        with open(manifest_path(store_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class LazyModels(MutableMapping):
+    """models dict of a split artifact that loads each model file on first access.
+
+    Arrays are opened with mmap_mode ('c' = copy-on-write, since statsmodels
+    needs writable buffers), so processes loading the same file share the
+    pages they only read. sklearn copies tree node arrays when unpickling,
+    so forests still end up in private memory.
+    """
+
+    def __init__(self, store_dir, entries, mmap_mode='c'):
+        self.store_dir = store_dir
+        self.entries = entries
+        self.mmap_mode = mmap_mode
+
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, model_name):
+        if model_name in self._loaded:
+            return self._loaded[model_name]
+        if model_name not in self.entries:
+            raise KeyError(model_name)
+
+        with self._lock:
+            if model_name not in self._loaded:
+                path = os.path.join(self.store_dir, self.entries[model_name]['file'])
+                self._loaded[model_name] = joblib.load(path, mmap_mode=self.mmap_mode)
+            return self._loaded[model_name]
+
+    def __setitem__(self, model_name, model_info):
+        self._loaded[model_name] = model_info
+        self.entries.setdefault(model_name, {})
+
+    def __delitem__(self, model_name):
+        self._loaded.pop(model_name, None)
+        del self.entries[model_name]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def is_loaded(self, model_name):
+        return model_name in self._loaded
+
+
+def load_model_store(store_dir=MODEL_STORE_DIR, mmap_mode='c'):
+    """Load a split artifact as (model_data, manifest).
+
+    model_data has the same keys as the single-file artifact; only the best
+    model is read now, the others when first used.
+    """
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No model manifest in {store_dir}")
+
+    model_data = {key: value for key, value in manifest.items() if key not in ['models', 'format_version']}
+    model_data['models'] = LazyModels(store_dir, dict(manifest['models']), mmap_mode=mmap_mode)
+
+    best_model_name = manifest.get('best_model_name')
+    if best_model_name in model_data['models']:
+        model_data['best_model'] = model_data['models'][best_model_name]
+
+    return model_data, manifest
+
+
+def load_model_data(store_dir=MODEL_STORE_DIR, legacy_path=LEGACY_MODEL_PATH, mmap_mode='c'):
+    """(model_data, manifest) from the split artifact, else from the legacy single file"""
+    if read_manifest(store_dir) is not None:
+        return load_model_store(store_dir, mmap_mode=mmap_mode)
+
+    model_data = joblib.load(legacy_path)
+    return model_data, build_manifest(model_data)
+
+
+def save_model_store(model_data, store_dir=MODEL_STORE_DIR, slim=True):
+    """Write model_data as a split artifact and return its manifest.
+
+    With slim=True, ARIMA/SARIMA results are slimmed (see slim_model_info)
+    before they are written.
+
+    Model files get fresh names and the manifest is replaced last, so a
+    reader sees either the old or the new artifact, and files that running
+    processes have memory-mapped are never rewritten in place. Files of the
+    previous manifest are kept one generation for readers still loading them.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    previous = read_manifest(store_dir) or {'models': {}}
+
+    models = model_data['models']
+    files = {}
+    for model_name in models:
+        # Models of this store that were never loaded are unchanged; keep their files
+        if (isinstance(models, LazyModels) and models.store_dir == store_dir
+                and not models.is_loaded(model_name) and 'file' in models.entries[model_name]):
+            files[model_name] = models.entries[model_name]['file']
+            continue
+
+        model_info = models[model_name]
+        if slim:
+            slim_model_info(model_name, model_info)
+        files[model_name] = f"{model_name}-{uuid.uuid4().hex[:8]}.joblib"
+        # Uncompressed, so numpy arrays can be memory-mapped on load
+        joblib.dump(model_info, os.path.join(store_dir, files[model_name]))
+
+    manifest = build_manifest(model_data, files)
+    with open(manifest_path(store_dir) + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path(store_dir) + '.tmp', manifest_path(store_dir))
+
+    keep = {MANIFEST_NAME} | set(files.values())
+    keep |= {entry.get('file') for entry in previous['models'].values()}
+    for filename in os.listdir(store_dir):
+        if filename.endswith('.joblib') and filename not in keep:
+            os.remove(os.path.join(store_dir, filename))
+
+    return manifest
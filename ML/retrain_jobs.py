@@ -0,0 +1,224 @@
+import logging
+import queue
+import threading
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from multiprocessing.managers import BaseManager
+
+logger = logging.getLogger(__name__)
+
+# The RetrainJobQueue methods a remote client may call (they return plain data)
+JOB_QUEUE_METHODS = ('submit', 'get', 'list', 'log_tail', 'cancel')
+
+
+class JobCancelled(Exception):
+    """Raised inside a runner when its job has been cancelled"""
+
+
+class RetrainJob:
+    """One queued or running retraining job"""
+
+    def __init__(self, mode, log_lines=500):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = 'Queued'
+        self.error = None
+        self.result = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+
+        self.cancel_event = threading.Event()
+        self.cancellable = True
+        self.process = None  # set by runners that start a subprocess
+        self._log = deque(maxlen=log_lines)
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.status in ['queued', 'running']
+
+    def log(self, line):
+        """Append a line to the job's log tail"""
+        with self._lock:
+            self._log.append(line.rstrip('\n'))
+
+    def log_tail(self, lines=50):
+        with self._lock:
+            return list(self._log)[-lines:]
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set() and self.cancellable
+
+    def request_cancel(self):
+        """Signal the job to stop; False once it can no longer be cancelled"""
+        with self._lock:
+            if not self.cancellable:
+                return False
+            self.cancel_event.set()
+            return True
+
+    def end_cancellable(self):
+        """Stop accepting cancels (the job is committing its results).
+
+        Returns whether a cancel was requested first.
+        """
+        with self._lock:
+            self.cancellable = False
+            return self.cancel_event.is_set()
+
+    def set_progress(self, fraction, message):
+        """Record progress; raises JobCancelled once the job is cancelled"""
+        if self.cancelled:
+            raise JobCancelled()
+        self.progress = round(fraction, 3)
+        self.message = message
+        self.log(f"[{fraction:.0%}] {message}")
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'mode': self.mode,
+            'status': self.status,
+            'cancellable': self.cancellable,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'result': self.result,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class RetrainJobQueue:
+    """Runs retraining jobs one at a time on a background thread.
+
+    runners maps a mode to a callable taking the job; whatever it returns is
+    stored as the job result. Submitting a mode that is already queued or
+    running returns the existing job instead of starting a second one.
+
+    The public methods take and return plain data (job dicts), so the queue
+    can also be used from other processes through serve_job_queue.
+    """
+
+    def __init__(self, runners, max_history=50):
+        self.runners = runners
+        self.max_history = max_history
+
+        self._jobs = OrderedDict()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, mode):
+        """Queue a job, returning (job dict, deduplicated)"""
+        if mode not in self.runners:
+            raise ValueError(f"Unknown retrain mode: {mode}")
+
+        with self._lock:
+            for job in self._jobs.values():
+                if job.mode == mode and job.active:
+                    return job.to_dict(), True
+
+            job = RetrainJob(mode)
+            self._jobs[job.id] = job
+            self._trim_history()
+
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='retrain-worker', daemon=True)
+                self._worker.start()
+
+        self._queue.put(job)
+        return job.to_dict(), False
+
+    def _get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get(self, job_id):
+        """A job's dict, or None for an unknown job"""
+        job = self._get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def list(self):
+        with self._lock:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    def log_tail(self, job_id, lines=50):
+        """Last lines of a job's log, or None for an unknown job"""
+        job = self._get(job_id)
+        return job.log_tail(lines) if job is not None else None
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or signal a running one to stop; returns the job's dict.
+
+        A job that is already saving its results is left to finish.
+        """
+        job = self._get(job_id)
+        if job is None or not job.active or not job.request_cancel():
+            return job.to_dict() if job is not None else None
+
+        if job.status == 'queued':
+            self._finish(job, 'cancelled', message='Cancelled before start')
+        elif job.process is not None and job.process.poll() is None:
+            job.process.terminate()
+        job.log('Cancellation requested')
+        return job.to_dict()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job.cancel_event.is_set():
+                continue
+
+            job.status = 'running'
+            job.started_at = datetime.now().isoformat()
+            job.log(f"Started {job.mode} retrain")
+
+            try:
+                result = self.runners[job.mode](job)
+                if job.cancelled:
+                    raise JobCancelled()
+                self._finish(job, 'succeeded', result=result, message='Completed')
+            except JobCancelled:
+                self._finish(job, 'cancelled', message='Cancelled')
+            except Exception as e:
+                logger.error(f"Retrain job {job.id} failed: {e}")
+                self._finish(job, 'failed', error=str(e), message='Failed')
+
+    def _finish(self, job, status, result=None, error=None, message=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.message = message or job.message
+        job.finished_at = datetime.now().isoformat()
+        job.log(f"Finished: {status}" + (f" ({error})" if error else ''))
+
+    def _trim_history(self):
+        # Forget the oldest finished jobs beyond max_history
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job_id]
+
+
+class RetrainJobManager(BaseManager):
+    """Shares one RetrainJobQueue between processes over a local socket"""
+
+
+def serve_job_queue(jobs, address, authkey):
+    """Serve jobs to connect_job_queue clients until the process is stopped"""
+    RetrainJobManager.register('jobs', callable=lambda: jobs, exposed=JOB_QUEUE_METHODS)
+    RetrainJobManager(address=address, authkey=authkey).get_server().serve_forever()
+
+
+def connect_job_queue(address, authkey):
+    """Proxy to the queue of serve_job_queue, with the same public methods"""
+    RetrainJobManager.register('jobs', exposed=JOB_QUEUE_METHODS)
+    manager = RetrainJobManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.jobs()
@@ -0,0 +1,28 @@
+"""
+Dedicated process that runs the API's retrain jobs.
+
+serve.py starts it before forking the gunicorn workers, and every worker
+sends its /retrain requests here. So all workers see the same jobs (status
+and cancel work whichever worker gets the request) and recycling a worker
+never interrupts a running retrain. Usage (normally started by serve.py):
+
+    RETRAIN_OWNER_AUTHKEY=<hex key> python retrain_owner.py <socket path>
+
+Workers reload the new artifacts through their model watchers; the reload a
+job does here only reports the new best model.
+"""
+import os
+import sys
+
+import flask_ml_api
+from retrain_jobs import serve_job_queue
+
+def main():
+    address = sys.argv[1]
+    authkey = bytes.fromhex(os.environ['RETRAIN_OWNER_AUTHKEY'])
+
+    print(f"🔁 Retrain jobs served on {address}")
+    serve_job_queue(flask_ml_api.retrain_jobs, address, authkey)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Dashboard backend (Dashboard/backend/server.js)
+SENSOR_API_URL = os.environ.get('SENSOR_API_URL', 'http://localhost:3001')
+
+# Minutes of readings requested per page; months of history are fetched as
+# many small pages, so only one page of JSON is held in memory at a time
+PAGE_MINUTES = int(os.environ.get('SENSOR_PAGE_MINUTES', 1440))
+REQUEST_TIMEOUT = float(os.environ.get('SENSOR_REQUEST_TIMEOUT', 120))
+
+# What the backend's un-paged /moisture-detailed has been serving: 30 days in
+# 60-minute buckets (it ignores the query's window and bucket size)
+DEFAULT_WINDOW_MIN = 43200
+DEFAULT_BUCKET_MIN = 60
+
+# Columns of /moisture-detailed and the dtype each is decoded into
+DETAILED_COLUMNS = {
+    'timestamp': 'datetime64[ns]',
+    'devicename': object,
+    'moisture': np.float64,
+    'temperature': np.float64,
+    'npk_n': np.float64,
+    'npk_p': np.float64,
+    'npk_k': np.float64,
+    'co2': np.float64
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Shared HTTP session: pooled keep-alive connections, retries with backoff"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=4,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=['GET']
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+def decode_rows(rows, device_codes):
+    """One page of JSON rows as typed column arrays.
+
+    devicename is stored as integer codes into device_codes (name -> code),
+    which is shared across pages so each name is kept once.
+    """
+    n = len(rows)
+    columns = {}
+    for column, dtype in DETAILED_COLUMNS.items():
+        if column == 'timestamp':
+            # Backend timestamps are UTC; keep them naive like the rest of the pipeline
+            stamps = pd.to_datetime([row.get('timestamp') for row in rows], utc=True)
+            columns[column] = stamps.tz_localize(None).to_numpy(dtype='datetime64[ns]')
+        elif column == 'devicename':
+            columns[column] = np.fromiter(
+                (device_codes.setdefault(row.get('devicename'), len(device_codes)) for row in rows),
+                dtype=np.int32, count=n
+            )
+        else:
+            # None (no reading in the bucket) becomes NaN
+            columns[column] = np.array([row.get(column) for row in rows], dtype=dtype)
+    return columns
+
+
+def page_bounds(start, end, bucket_min, page_minutes=PAGE_MINUTES):
+    """[page_start, page_end) ranges covering start..end.
+
+    Pages start on bucket boundaries and span whole buckets, so no bucket is
+    split between two pages.
+    """
+    bucket = pd.Timedelta(minutes=bucket_min)
+    page = bucket * max(1, -(-page_minutes // bucket_min))
+
+    page_start = pd.Timestamp(start).floor(bucket)
+    end = pd.Timestamp(end)
+    while page_start < end:
+        yield page_start, min(page_start + page, end)
+        page_start += page
+
+
+def device_name_array(device_codes):
+    """Array mapping each device code back to its name"""
+    names = np.empty(len(device_codes), dtype=object)
+    for name, code in device_codes.items():
+        names[code] = name
+    return names
+
+
+def fetch_page(page_start, page_end, bucket_min, device_codes, session=None):
+    """Columns of one [page_start, page_end) page, or None if it has no readings"""
+    session = session or get_session()
+    response = session.get(
+        f"{SENSOR_API_URL}/moisture-detailed",
+        params={
+            'bucket_min': bucket_min,
+            'start': page_start.isoformat(),
+            'end': page_end.isoformat()
+        },
+        timeout=REQUEST_TIMEOUT
+    )
+    response.raise_for_status()
+    rows = response.json()
+    return decode_rows(rows, device_codes) if rows else None
+
+
+def iter_detailed_pages(start, end, bucket_min=DEFAULT_BUCKET_MIN, page_minutes=PAGE_MINUTES, session=None, device_codes=None):
+    """Yield /moisture-detailed readings between start and end (naive UTC), one page of columns at a time"""
+    device_codes = {} if device_codes is None else device_codes
+
+    for page_start, page_end in page_bounds(start, end, bucket_min, page_minutes):
+        page = fetch_page(page_start, page_end, bucket_min, device_codes, session)
+        if page is not None:
+            yield page
+
+
+def fetch_detailed_range(start, end, bucket_min=DEFAULT_BUCKET_MIN, page_minutes=PAGE_MINUTES, session=None):
+    """/moisture-detailed readings between start and end as a DataFrame sorted by time"""
+    device_codes = {}
+    pages = {column: [] for column in DETAILED_COLUMNS}
+    for page in iter_detailed_pages(start, end, bucket_min, page_minutes, session, device_codes):
+        for column, values in page.items():
+            pages[column].append(values)
+
+    if not pages['timestamp']:
+        return pd.DataFrame({
+            column: np.array([], dtype=dtype) for column, dtype in DETAILED_COLUMNS.items()
+        })
+
+    columns = {column: np.concatenate(chunks) for column, chunks in pages.items()}
+    columns['devicename'] = device_name_array(device_codes)[columns['devicename']]
+
+    return pd.DataFrame(columns, copy=False)
+
+
+def fetch_live_detailed_data(window_min=DEFAULT_WINDOW_MIN, bucket_min=DEFAULT_BUCKET_MIN):
+    """Readings of the last window_min minutes, or None if the backend cannot be read"""
+    try:
+        end = pd.Timestamp.now('UTC').tz_localize(None)
+        start = end - pd.Timedelta(minutes=window_min)
+        df = fetch_detailed_range(start, end, bucket_min=bucket_min)
+        print(f"📡 Fetched {len(df)} rows ({df['devicename'].nunique()} devices, "
+              f"{df.memory_usage(deep=False).sum() / 1e6:.1f} MB)")
+        return df
+    except Exception as e:
+        print(f"❌ Error fetching data: {e}")
+        return None
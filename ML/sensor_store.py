@@ -0,0 +1,226 @@
+import json
+import os
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from sensor_data import (DEFAULT_BUCKET_MIN, DEFAULT_WINDOW_MIN, DETAILED_COLUMNS, PAGE_MINUTES,
+                         device_name_array, fetch_page, page_bounds)
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; syncs there are not serialized between processes
+    fcntl = None
+
+# Local copy of the backend's sensor history, laid out as
+#   data/sensor_history/devicename=<device>/date=<YYYY-MM-DD>/part-<id>-0.parquet
+#   data/sensor_history/sync_state.json    bucket size and the synced time range
+SENSOR_STORE_DIR = os.environ.get('SENSOR_STORE_DIR', 'data/sensor_history')
+STATE_NAME = 'sync_state.json'
+LOCK_NAME = '.sync.lock'
+
+VALUE_COLUMNS = [column for column in DETAILED_COLUMNS if column not in ['timestamp', 'devicename']]
+
+# Columns stored in the parquet files (devicename and date live in the directory names)
+FILE_SCHEMA = pa.schema(
+    [('timestamp', pa.timestamp('ns'))] + [(column, pa.float64()) for column in VALUE_COLUMNS]
+)
+PARTITION_SCHEMA = pa.schema([('devicename', pa.string()), ('date', pa.string())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+DATASET_SCHEMA = pa.unify_schemas([FILE_SCHEMA, PARTITION_SCHEMA])
+
+
+def read_state(store_dir=SENSOR_STORE_DIR):
+    """The store's sync state, or None for an empty store"""
+    try:
+        with open(os.path.join(store_dir, STATE_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_state(state, store_dir=SENSOR_STORE_DIR):
+    path = os.path.join(store_dir, STATE_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def append_page(page, device_codes, store_dir=SENSOR_STORE_DIR):
+    """Write one decoded page as new files in its device/day partitions"""
+    timestamps = page['timestamp']
+    columns = {'timestamp': pa.array(timestamps, type=pa.timestamp('ns'))}
+    for column in VALUE_COLUMNS:
+        columns[column] = pa.array(page[column], type=pa.float64())
+    columns['devicename'] = pa.array(device_name_array(device_codes)[page['devicename']], type=pa.string())
+    columns['date'] = pa.array(np.datetime_as_string(timestamps, unit='D'), type=pa.string())
+
+    ds.write_dataset(
+        pa.table(columns),
+        store_dir,
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template=f"part-{uuid.uuid4().hex[:12]}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore'
+    )
+    return len(timestamps)
+
+
+def compact_partitions(before_date, store_dir=SENSOR_STORE_DIR):
+    """Merge the files of each closed day (date < before_date) into one file.
+
+    Every sync appends a file per device and day it touched; once a day can
+    no longer change its files are rewritten as one, written before the old
+    ones are removed.
+    """
+    merged = 0
+    for device_dir in os.listdir(store_dir):
+        if not device_dir.startswith('devicename='):
+            continue
+        for date_dir in os.listdir(os.path.join(store_dir, device_dir)):
+            if not date_dir.startswith('date=') or date_dir[len('date='):] >= before_date:
+                continue
+
+            partition = os.path.join(store_dir, device_dir, date_dir)
+            files = sorted(name for name in os.listdir(partition) if name.endswith('.parquet'))
+            if len(files) < 2:
+                continue
+
+            table = pa.concat_tables([pq.read_table(os.path.join(partition, name), schema=FILE_SCHEMA) for name in files])
+            table = table.sort_by('timestamp')
+            pq.write_table(table, os.path.join(partition, f"part-{uuid.uuid4().hex[:12]}-0.parquet"))
+            for name in files:
+                os.remove(os.path.join(partition, name))
+            merged += 1
+    return merged
+
+
+class _SyncLock:
+    """Exclusive lock on the store, so two scripts syncing at once do not both append"""
+
+    def __init__(self, store_dir):
+        self.path = os.path.join(store_dir, LOCK_NAME)
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def sync_store(window_min=DEFAULT_WINDOW_MIN, bucket_min=DEFAULT_BUCKET_MIN, store_dir=SENSOR_STORE_DIR,
+               page_minutes=PAGE_MINUTES, session=None):
+    """Fetch the readings the store is missing for the last window_min minutes.
+
+    Only complete buckets are stored, and the synced range only ever grows:
+    newer readings are appended after it, and a longer window than before is
+    backfilled before it (newest page first). The state is saved after every
+    page, so an interrupted sync resumes without writing a page twice.
+    Returns the number of rows added.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    bucket = pd.Timedelta(minutes=bucket_min)
+    end = pd.Timestamp.now('UTC').tz_localize(None).floor(bucket)
+    start = (end - pd.Timedelta(minutes=window_min)).floor(bucket)
+
+    with _SyncLock(store_dir):
+        state = read_state(store_dir)
+        if state is None:
+            state = {'bucket_min': bucket_min, 'synced_from': end.isoformat(), 'synced_to': end.isoformat()}
+        elif state['bucket_min'] != bucket_min:
+            raise ValueError(f"Store {store_dir} holds {state['bucket_min']}-minute buckets, not {bucket_min}")
+
+        device_codes = {}
+        added = 0
+
+        # Backfill older readings, walking back from the start of the synced range
+        synced_from = pd.Timestamp(state['synced_from'])
+        for page_start, page_end in reversed(list(page_bounds(start, synced_from, bucket_min, page_minutes))):
+            page = fetch_page(page_start, page_end, bucket_min, device_codes, session)
+            if page is not None:
+                added += append_page(page, device_codes, store_dir)
+            state['synced_from'] = page_start.isoformat()
+            write_state(state, store_dir)
+
+        # New readings since the last sync
+        synced_to = pd.Timestamp(state['synced_to'])
+        for page_start, page_end in page_bounds(synced_to, end, bucket_min, page_minutes):
+            page = fetch_page(page_start, page_end, bucket_min, device_codes, session)
+            if page is not None:
+                added += append_page(page, device_codes, store_dir)
+            state['synced_to'] = page_end.isoformat()
+            write_state(state, store_dir)
+
+        state['last_sync'] = datetime.now().isoformat()
+        write_state(state, store_dir)
+
+        compact_partitions(pd.Timestamp(state['synced_to']).strftime('%Y-%m-%d'), store_dir)
+
+    return added
+
+
+def read_history(start=None, end=None, columns=None, devices=None, store_dir=SENSOR_STORE_DIR):
+    """Stored readings with start <= timestamp < end (naive UTC), sorted by time.
+
+    The time range, devices and columns are pushed down into the scan: only
+    the matching device/day directories are opened, and only the requested
+    columns are read from them.
+    """
+    if not os.path.isdir(store_dir) or read_state(store_dir) is None:
+        return pd.DataFrame({column: np.array([], dtype=dtype) for column, dtype in DETAILED_COLUMNS.items()})
+
+    dataset = ds.dataset(store_dir, format='parquet', partitioning=PARTITIONING, schema=DATASET_SCHEMA,
+                         ignore_prefixes=['.', '_', STATE_NAME])
+
+    condition = None
+    def narrow(expression):
+        nonlocal condition
+        condition = expression if condition is None else condition & expression
+
+    if start is not None:
+        start = pd.Timestamp(start)
+        narrow(ds.field('date') >= start.strftime('%Y-%m-%d'))
+        narrow(ds.field('timestamp') >= pa.scalar(start.to_pydatetime(), type=pa.timestamp('ns')))
+    if end is not None:
+        end = pd.Timestamp(end)
+        narrow(ds.field('date') <= end.strftime('%Y-%m-%d'))
+        narrow(ds.field('timestamp') < pa.scalar(end.to_pydatetime(), type=pa.timestamp('ns')))
+    if devices is not None:
+        narrow(ds.field('devicename').isin(list(devices)))
+
+    read_columns = ['timestamp', 'devicename'] + [column for column in (columns or VALUE_COLUMNS) if column in VALUE_COLUMNS]
+    df = dataset.to_table(columns=read_columns, filter=condition).to_pandas()
+    return df.sort_values(['timestamp', 'devicename'], kind='mergesort').reset_index(drop=True)
+
+
+def load_sensor_history(window_min=DEFAULT_WINDOW_MIN, bucket_min=DEFAULT_BUCKET_MIN, columns=None, store_dir=SENSOR_STORE_DIR):
+    """Readings of the last window_min minutes: sync the store, then read it locally.
+
+    If the backend cannot be reached the readings already stored are used;
+    returns None if there are none.
+    """
+    try:
+        added = sync_store(window_min, bucket_min, store_dir)
+        print(f"🔄 Synced {added} new rows into {store_dir}")
+    except Exception as e:
+        print(f"⚠️ Could not sync sensor history ({e}), using the local store")
+
+    end = pd.Timestamp.now('UTC').tz_localize(None)
+    df = read_history(start=end - pd.Timedelta(minutes=window_min), columns=columns, store_dir=store_dir)
+    if df.empty:
+        print("❌ No sensor history available")
+        return None
+
+    print(f"📦 Read {len(df)} rows ({df['devicename'].nunique()} devices) from {store_dir}")
+    return df
@@ -0,0 +1,133 @@
+"""
+Production entry point for the moisture prediction API.
+
+Runs flask_ml_api under gunicorn: the models are loaded once in the master
+process and the workers are forked from it, so model memory is shared
+copy-on-write. Usage:
+
+    python serve.py
+
+Settings (environment variables):
+    SERVE_BIND                 address to listen on (default 0.0.0.0:5000)
+    SERVE_WORKERS              worker processes (default: CPU count)
+    SERVE_THREADS_PER_WORKER   BLAS/OpenMP/sklearn threads per worker (default 1)
+    SERVE_TIMEOUT              seconds before a silent worker is killed (default 300)
+    SERVE_GRACEFUL_TIMEOUT     seconds a worker gets to finish on restart (default 60)
+    SERVE_MAX_REQUESTS         requests before a worker is recycled (default 1000)
+    SERVE_MAX_REQUESTS_JITTER  random extra requests so workers recycle apart (default 100)
+
+Retrain jobs run in one dedicated process (retrain_owner.py) that every
+worker forwards /retrain requests to, so job status and cancel work through
+any worker and recycled workers never take a running retrain with them.
+Every worker reloads new artifacts through its model watcher.
+"""
+import os
+
+# Thread pools are sized when numpy/sklearn are imported, so limit them first:
+# with one process per core, extra threads per worker only oversubscribe
+THREADS_PER_WORKER = os.environ.get('SERVE_THREADS_PER_WORKER', '1')
+for thread_var in ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS', 'MODEL_N_JOBS']:
+    os.environ.setdefault(thread_var, THREADS_PER_WORKER)
+
+# Requests are already spread over worker processes; a process pool per worker
+# would multiply the process count
+os.environ.setdefault('BATCH_EXECUTION_MODE', 'serial')
+
+import atexit
+import gc
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+
+from gunicorn.app.base import BaseApplication
+
+import flask_ml_api
+
+# (socket path, authkey) of the retrain job process, set before the workers fork
+RETRAIN_OWNER = None
+
+def start_retrain_owner(startup_timeout=30):
+    """Start retrain_owner.py and wait until it accepts connections"""
+    authkey = secrets.token_bytes(32)
+    address = os.path.join(tempfile.mkdtemp(prefix='retrain-owner-'), 'jobs.sock')
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'retrain_owner.py'), address],
+        env=dict(os.environ, RETRAIN_OWNER_AUTHKEY=authkey.hex())
+    )
+    atexit.register(process.terminate)
+
+    deadline = time.monotonic() + startup_timeout
+    while not os.path.exists(address):
+        if process.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("Retrain job process failed to start")
+        time.sleep(0.1)
+    return address, authkey
+
+def post_fork(server, worker):
+    """Each worker watches the model files itself and reloads on change"""
+    flask_ml_api.start_model_watcher()
+    flask_ml_api.use_retrain_owner(*RETRAIN_OWNER)
+    server.log.info(f"Worker {worker.pid} serving model version "
+                    f"{flask_ml_api.model_bundle.version if flask_ml_api.model_bundle else None}")
+
+class ProductionApplication(BaseApplication):
+    """gunicorn application serving an already imported Flask app"""
+
+    def __init__(self, app, options=None):
+        self.application = app
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+def main():
+    global RETRAIN_OWNER
+
+    print("🚀 Starting Moisture Prediction API (production)")
+    print("=" * 50)
+
+    # Preload in the master so forked workers share the model pages
+    print("📦 Loading pre-trained models...")
+    bundle = flask_ml_api.load_trained_models()
+    if bundle is None:
+        print("❌ Failed to load models!")
+        print("💡 Please run the training script first:")
+        print("   python train_and_save.py")
+        print("   (workers will pick the models up once they are saved)")
+    else:
+        print(f"✅ Best model: {bundle.best_model_name} (version {bundle.version})")
+
+    print("🔁 Starting the retrain job process...")
+    RETRAIN_OWNER = start_retrain_owner()
+
+    # Keep the loaded objects out of the workers' garbage collection passes,
+    # which would otherwise write to (and so copy) every shared page
+    gc.freeze()
+
+    options = {
+        'bind': os.environ.get('SERVE_BIND', '0.0.0.0:5000'),
+        'workers': int(os.environ.get('SERVE_WORKERS', os.cpu_count() or 1)),
+        'preload_app': True,
+        'timeout': int(os.environ.get('SERVE_TIMEOUT', 300)),
+        'graceful_timeout': int(os.environ.get('SERVE_GRACEFUL_TIMEOUT', 60)),
+        'max_requests': int(os.environ.get('SERVE_MAX_REQUESTS', 1000)),
+        'max_requests_jitter': int(os.environ.get('SERVE_MAX_REQUESTS_JITTER', 100)),
+        'post_fork': post_fork
+    }
+
+    print(f"🔧 {options['workers']} workers x {THREADS_PER_WORKER} threads on {options['bind']}")
+    print("=" * 50)
+
+    ProductionApplication(flask_ml_api.app, options).run()
+
+if __name__ == "__main__":
+    main()
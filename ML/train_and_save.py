@@ -1,63 +1,180 @@
 import os
+import re
+import json
+import time
+import multiprocessing
 import pandas as pd
 import numpy as np
 import joblib
-import requests
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from sklearn.model_selection import TimeSeriesSplit
 from statsmodels.tsa.arima.model import ARIMA
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 from statsmodels.tsa.stattools import adfuller
+from feature_pipeline import FeaturePlan, prepare_readings
+from model_store import MODEL_STORE_DIR, save_model_store, slim_model_info
+from sensor_data import DEFAULT_BUCKET_MIN
+from sensor_store import load_sensor_history
 import warnings
 warnings.filterwarnings('ignore')
 
+# ARIMA order search used by main(): 'grid' or 'stepwise'
+ARIMA_SEARCH = os.environ.get('ARIMA_SEARCH', 'grid')
+
+# SARIMA search used by main() (see train_sarima_model): a JSON list of
+# [order, seasonal_order] pairs (unset keeps the built-in configs), the fit
+# budget per config in seconds (enforced where configs fit on a pool, so not
+# inside per-device workers), and the factor to down-sample the series by to
+# rank the configs before the full fits (unset fits every config)
+SARIMA_CONFIGS = json.loads(os.environ['SARIMA_CONFIGS']) if os.environ.get('SARIMA_CONFIGS') else None
+SARIMA_CONFIG_TIMEOUT = float(os.environ['SARIMA_CONFIG_TIMEOUT']) if os.environ.get('SARIMA_CONFIG_TIMEOUT') else None
+SARIMA_RANK_DOWNSAMPLE = int(os.environ['SARIMA_RANK_DOWNSAMPLE']) if os.environ.get('SARIMA_RANK_DOWNSAMPLE') else None
+
+def sarima_search_options():
+    """train_sarima_model keyword arguments from the SARIMA_* settings"""
+    return {
+        'configs': SARIMA_CONFIGS,
+        'config_timeout': SARIMA_CONFIG_TIMEOUT,
+        'rank_downsample': SARIMA_RANK_DOWNSAMPLE
+    }
+
+# 'global' trains one set of models on all rows; 'per_device' trains each
+# device separately and writes a per-device model registry
+TRAINING_MODE = os.environ.get('TRAINING_MODE', 'global')
+DEVICE_REGISTRY_DIR = 'models/devices'
+
+def resolve_n_jobs(n_jobs=None):
+    """Number of worker processes to use (None or -1 means every core)"""
+    if n_jobs is None or n_jobs < 0:
+        return os.cpu_count() or 1
+    return max(1, n_jobs)
+
+def open_pool(n_jobs=None, max_tasks=None):
+    """A process pool of up to n_jobs workers (at most max_tasks), or None when that is 1"""
+    n_jobs = resolve_n_jobs(n_jobs)
+    if max_tasks is not None:
+        n_jobs = min(n_jobs, max(max_tasks, 1))
+    return multiprocessing.get_context().Pool(n_jobs) if n_jobs > 1 else None
+
+def close_pool(pool):
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+
+def run_in_pool(fn, arg_list, n_jobs=None, timeout=None, pool=None):
+    """Run fn(*args) for every args tuple, on a process pool when n_jobs > 1.
+
+    Results come back in input order. Exceptions are returned in place of
+    the result. With a timeout, each task gets that budget counted from when
+    it could first start; tasks that overrun come back as TimeoutError and
+    their workers are terminated. Timeouts only apply on the pool path.
+
+    pool runs the tasks on a pool from open_pool that the caller reuses
+    across calls and closes itself (no timeout, since overrunning workers
+    could not be terminated without ending the pool).
+    """
+    if pool is not None:
+        if timeout is not None:
+            raise ValueError("timeouts need a pool of their own")
+        results = []
+        for async_result in [pool.apply_async(fn, args) for args in arg_list]:
+            try:
+                results.append(async_result.get())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    n_jobs = min(resolve_n_jobs(n_jobs), max(len(arg_list), 1))
+
+    if n_jobs == 1:
+        results = []
+        for args in arg_list:
+            try:
+                results.append(fn(*args))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    pool = multiprocessing.get_context().Pool(n_jobs)
+    try:
+        start = time.perf_counter()
+        pending = [pool.apply_async(fn, args) for args in arg_list]
+
+        results = []
+        for position, async_result in enumerate(pending):
+            if timeout is None:
+                wait = None
+            else:
+                # Tasks start in waves of n_jobs, so later tasks get extra budget
+                wait = max(0, start + timeout * (position // n_jobs + 1) - time.perf_counter())
+
+            try:
+                results.append(async_result.get(timeout=wait))
+            except multiprocessing.TimeoutError:
+                results.append(TimeoutError(f"exceeded {timeout}s budget"))
+            except Exception as e:
+                results.append(e)
+        return results
+    finally:
+        # Kills any task still running past its budget
+        close_pool(pool)
+
+def fit_arima_order(series, order):
+    """Fit one ARIMA order, returning its AIC, fit time and failure reason"""
+    start = time.perf_counter()
+    try:
+        fitted_model = ARIMA(series, order=order).fit()
+        return {'order': order, 'aic': float(fitted_model.aic), 'fit_time': time.perf_counter() - start, 'error': None}
+    except Exception as e:
+        return {'order': order, 'aic': None, 'fit_time': time.perf_counter() - start, 'error': f"{type(e).__name__}: {e}"}
+
+def fit_sarima_config(series, order, seasonal_order, return_model=False):
+    """Fit one SARIMA config, returning its AIC, fit time and failure reason"""
+    start = time.perf_counter()
+    record = {'order': order, 'seasonal_order': seasonal_order, 'aic': None, 'fit_time': 0.0, 'error': None}
+    try:
+        fitted_model = SARIMAX(series, order=order, seasonal_order=seasonal_order).fit(disp=False)
+        record['aic'] = float(fitted_model.aic)
+        if return_model:
+            record['model'] = fitted_model
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['fit_time'] = time.perf_counter() - start
+    return record
+
+def print_sarima_timing(timing):
+    """Print the per-config timing table of a SARIMA training run"""
+    print(f"  {'stage':<9}{'order':<12}{'seasonal':<16}{'AIC':>12}{'fit time':>11}  status")
+    for record in timing:
+        aic = f"{record['aic']:.2f}" if record['aic'] is not None else '-'
+        status = record['error'] or 'ok'
+        print(f"  {record['stage']:<9}{str(record['order']):<12}{str(record['seasonal_order']):<16}"
+              f"{aic:>12}{record['fit_time']:>10.2f}s  {status}")
+
+def print_search_report(report):
+    """Print per-order fit times and failure reasons of an order search"""
+    print(f"  {'order':<14}{'AIC':>12}{'fit time':>11}  status")
+    for record in report:
+        aic = f"{record['aic']:.2f}" if record['aic'] is not None else '-'
+        status = record['error'] or 'ok'
+        print(f"  {str(record['order']):<14}{aic:>12}{record['fit_time']:>10.2f}s  {status}")
+
 class OptimalMoisturePrediction:
-    def __init__(self):
+    def __init__(self, n_jobs=None):
         self.models = {}
         self.best_model = None
         self.best_model_name = None
         self.feature_names = None
-        
-    def prepare_features(self, df):
-        """Enhanced feature engineering for soil moisture prediction"""
-        df = df.copy()
-        
-        # Time-based features
-        if 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.set_index('timestamp').sort_index()
-            
-            # Cyclical time features (better than categorical)
-            df['hour_sin'] = np.sin(2 * np.pi * df.index.hour / 24)
-            df['hour_cos'] = np.cos(2 * np.pi * df.index.hour / 24)
-            df['day_sin'] = np.sin(2 * np.pi * df.index.dayofyear / 365)
-            df['day_cos'] = np.cos(2 * np.pi * df.index.dayofyear / 365)
-            df['month_sin'] = np.sin(2 * np.pi * df.index.month / 12)
-            df['month_cos'] = np.cos(2 * np.pi * df.index.month / 12)
-        
-        # Lag features for soil moisture
-        if 'Soil Moisture' in df.columns:
-            for lag in [1, 2, 3, 6, 12, 24]:  # hours/days depending on frequency
-                df[f'moisture_lag_{lag}'] = df['Soil Moisture'].shift(lag)
-            
-            # Rolling statistics
-            for window in [3, 7, 14]:
-                df[f'moisture_rolling_mean_{window}'] = df['Soil Moisture'].rolling(window).mean()
-                df[f'moisture_rolling_std_{window}'] = df['Soil Moisture'].rolling(window).std()
-        
-        # Weather-based features if available
-        if 'temperature' in df.columns:
-            df['temp_moisture_ratio'] = df['temperature'] / (df['Soil Moisture'] + 1e-6)
-        
-        # NPK ratios and interactions
-        npk_cols = ['npk_n', 'npk_p', 'npk_k']
-        if all(col in df.columns for col in npk_cols):
-            df['npk_total'] = df[npk_cols].sum(axis=1)
-            for col in npk_cols:
-                df[f'{col}_ratio'] = df[col] / (df['npk_total'] + 1e-6)
-        
-        return df
+        self.feature_plan = None
+        self.n_jobs = n_jobs
+        self.arima_search_report = []
+        self.data_end_timestamp = None
+        
+    def prepare_features(self, df, plan=None):
+        """Enhanced feature engineering for soil moisture prediction (every feature, or those of plan)"""
+        readings = prepare_readings(df)
+        return (plan or FeaturePlan.for_readings(readings)).compute(readings)
     
     def evaluate_stationarity(self, series, verbose=True):
         """Check if series is stationary"""
@@ -71,34 +188,116 @@ class OptimalMoisturePrediction:
         is_stationary = adf_result[1] < 0.05
         return is_stationary, adf_result
     
-    def find_optimal_arima_order(self, series, max_p=3, max_d=2, max_q=3):
-        """Auto-select optimal ARIMA parameters using AIC"""
-        best_aic = np.inf
-        best_order = None
-        best_model = None
-        
-        print("Searching for optimal ARIMA parameters...")
-        
-        for p in range(max_p + 1):
-            for d in range(max_d + 1):
-                for q in range(max_q + 1):
-                    try:
-                        model = ARIMA(series, order=(p, d, q))
-                        fitted_model = model.fit()
-                        
-                        if fitted_model.aic < best_aic:
-                            best_aic = fitted_model.aic
-                            best_order = (p, d, q)
-                            best_model = fitted_model
-                            
-                    except:
-                        continue
-        
-        print(f"Best ARIMA order: {best_order} with AIC: {best_aic:.2f}")
+    def select_differencing_order(self, series, max_d=2):
+        """Smallest d whose differenced series passes the ADF test"""
+        series = series.replace([np.inf, -np.inf], np.nan).dropna()
+
+        for d in range(max_d):
+            is_stationary, _ = self.evaluate_stationarity(series, verbose=False)
+            if is_stationary:
+                return d
+            series = series.diff().dropna()
+
+        return max_d
+
+    def evaluate_arima_orders(self, series, orders, pool=None):
+        """Fit the given orders in parallel (on pool if given), returning one report record each"""
+        records = []
+        args = [(series, order) for order in orders]
+        for order, record in zip(orders, run_in_pool(fit_arima_order, args, self.n_jobs, pool=pool)):
+            if isinstance(record, Exception):
+                record = {'order': order, 'aic': None, 'fit_time': 0.0, 'error': f"{type(record).__name__}: {record}"}
+            records.append(record)
+        return records
+
+    def find_optimal_arima_order(self, series, max_p=3, max_d=2, max_q=3, d=None, method='grid'):
+        """Auto-select optimal ARIMA parameters using AIC.
+
+        d is taken from the ADF test instead of being searched. method='grid'
+        fits every (p, q) up to (max_p, max_q) in parallel, so it finds the
+        lowest-AIC order at that d. method='stepwise' runs a
+        Hyndman-Khandakar style search instead, which only visits neighbours
+        of the current best order; it is a heuristic and can stop at a local
+        minimum the grid would have passed.
+        """
+        if d is None:
+            d = self.select_differencing_order(series, max_d)
+
+        print(f"Searching for optimal ARIMA parameters ({method}, d={d} from ADF test)...")
+
+        if method == 'grid':
+            report = self._grid_search_orders(series, max_p, d, max_q)
+        elif method == 'stepwise':
+            report = self._stepwise_search_orders(series, max_p, d, max_q)
+        else:
+            raise ValueError(f"Unknown ARIMA search method: {method}")
+
+        print_search_report(report)
+        self.arima_search_report = report
+
+        fitted = [record for record in report if record['aic'] is not None]
+        if not fitted:
+            print("❌ No ARIMA order could be fitted")
+            return None, None
+
+        best_record = min(fitted, key=lambda record: record['aic'])
+        best_order = best_record['order']
+
+        # Workers only report AICs, so refit the winner here
+        best_model = ARIMA(series, order=best_order).fit()
+
+        print(f"Best ARIMA order: {best_order} with AIC: {best_record['aic']:.2f}")
         return best_order, best_model
+
+    def _grid_search_orders(self, series, max_p, d, max_q):
+        """Exhaustive (p, q) search, every order fitted in one parallel pass"""
+        orders = [(p, d, q) for p in range(max_p + 1) for q in range(max_q + 1)]
+        return self.evaluate_arima_orders(series, orders)
+
+    def _stepwise_search_orders(self, series, max_p, d, max_q):
+        """Stepwise search: start from seed orders and move to better neighbours"""
+        seeds = [(2, d, 2), (0, d, 0), (1, d, 0), (0, d, 1)]
+        candidates = [(min(p, max_p), d, min(q, max_q)) for p, _, q in seeds]
+
+        visited = set()
+        report = []
+        best_record = None
+
+        # One pool for every iteration (at most 8 neighbours are fitted at once)
+        pool = open_pool(self.n_jobs, max_tasks=8)
+        try:
+            while True:
+                candidates = [order for order in dict.fromkeys(candidates) if order not in visited]
+                if not candidates:
+                    break
+
+                visited.update(candidates)
+                records = self.evaluate_arima_orders(series, candidates, pool=pool)
+                report.extend(records)
+
+                improved = [
+                    record for record in records
+                    if record['aic'] is not None and (best_record is None or record['aic'] < best_record['aic'])
+                ]
+                if not improved:
+                    break
+
+                best_record = min(improved, key=lambda record: record['aic'])
+                p, _, q = best_record['order']
+
+                # Neighbours: change p and/or q by one
+                candidates = [
+                    (p + dp, d, q + dq)
+                    for dp in (-1, 0, 1) for dq in (-1, 0, 1)
+                    if (dp or dq) and 0 <= p + dp <= max_p and 0 <= q + dq <= max_q
+                ]
+        finally:
+            close_pool(pool)
+
+        return report
     
-    def train_arima_model(self, df):
-        """Train optimized ARIMA model"""
+    def train_arima_model(self, df, search='grid', max_p=3, max_q=3):
+        """Train optimized ARIMA model (search is 'grid' or 'stepwise')"""
         series = df['Soil Moisture'].dropna()
         
         if len(series) < 50:
@@ -108,22 +307,36 @@ class OptimalMoisturePrediction:
         # Check stationarity
         is_stationary, _ = self.evaluate_stationarity(series)
         
-        # Find optimal parameters
-        best_order, arima_model = self.find_optimal_arima_order(series)
+        # Find optimal parameters (a stationary series needs no differencing)
+        best_order, arima_model = self.find_optimal_arima_order(
+            series, max_p=max_p, max_q=max_q, d=0 if is_stationary else None, method=search
+        )
         
         if arima_model:
             self.models['ARIMA'] = {
                 'model': arima_model,
                 'order': best_order,
                 'is_stationary': is_stationary,
-                'last_values': series.tail(max(best_order)).tolist()  # Store for forecasting
+                'last_values': series.tail(max(best_order)).tolist(),  # Store for forecasting
+                'train_mean': float(series.mean()),  # Used by the API to detect drift
+                'train_std': float(series.std()),
+                'search_report': self.arima_search_report
             }
             print("✅ ARIMA model trained successfully")
         
         return arima_model
     
-    def train_sarima_model(self, df, seasonal_period=24):
-        """Train SARIMA model for seasonal patterns"""
+    def train_sarima_model(self, df, seasonal_period=24, configs=None, config_timeout=None,
+                           rank_downsample=None, rank_top_k=2):
+        """Train SARIMA model for seasonal patterns.
+
+        configs is a list of (order, seasonal_order) pairs; a 3-element
+        seasonal_order gets seasonal_period appended. Configs are fitted
+        concurrently, each within config_timeout seconds. With
+        rank_downsample=k the configs are first ranked on a k-times
+        down-sampled series and only the best rank_top_k are fitted at full
+        resolution.
+        """
         series = df['Soil Moisture'].dropna()
         
         if len(series) < seasonal_period * 2:
@@ -132,43 +345,102 @@ class OptimalMoisturePrediction:
         
         try:
             # Try different SARIMA configurations
+            if configs is None:
+                configs = [
+                    ((1, 1, 1), (1, 1, 1, seasonal_period)),
+                    ((2, 1, 0), (1, 1, 1, seasonal_period)),
+                    ((1, 1, 2), (1, 1, 1, seasonal_period))
+                ]
             configs = [
-                ((1, 1, 1), (1, 1, 1, seasonal_period)),
-                ((2, 1, 0), (1, 1, 1, seasonal_period)),
-                ((1, 1, 2), (1, 1, 1, seasonal_period))
+                (tuple(order), tuple(seasonal_order) if len(seasonal_order) == 4 else tuple(seasonal_order) + (seasonal_period,))
+                for order, seasonal_order in configs
             ]
+
+            timing = []
+
+            if rank_downsample and len(configs) > rank_top_k:
+                configs = self._rank_sarima_configs(series, configs, rank_downsample, rank_top_k, config_timeout, timing)
+
+            records = self.evaluate_sarima_configs(series, configs, config_timeout, stage='full', return_model=True)
+            timing.extend(records)
+
+            print_sarima_timing(timing)
+
+            fitted = [record for record in records if record['aic'] is not None]
+            best_record = min(fitted, key=lambda record: record['aic']) if fitted else None
             
-            best_aic = np.inf
-            best_model = None
-            best_config = None
-            
-            for order, seasonal_order in configs:
-                try:
-                    model = SARIMAX(series, order=order, seasonal_order=seasonal_order)
-                    fitted_model = model.fit(disp=False)
-                    
-                    if fitted_model.aic < best_aic:
-                        best_aic = fitted_model.aic
-                        best_model = fitted_model
-                        best_config = (order, seasonal_order)
-                        
-                except:
-                    continue
-            
-            if best_model:
+            if best_record:
+                best_model = best_record.pop('model')
+                for record in records:
+                    record.pop('model', None)
+
                 self.models['SARIMA'] = {
                     'model': best_model,
-                    'order': best_config[0],
-                    'seasonal_order': best_config[1],
-                    'seasonal_period': seasonal_period,
-                    'aic': best_aic
+                    'order': best_record['order'],
+                    'seasonal_order': best_record['seasonal_order'],
+                    'seasonal_period': best_record['seasonal_order'][3],
+                    'aic': best_record['aic'],
+                    'train_mean': float(series.mean()),
+                    'train_std': float(series.std()),
+                    'timing': timing
                 }
-                print(f"✅ SARIMA model trained with AIC: {best_aic:.2f}")
+                print(f"✅ SARIMA model trained with AIC: {best_record['aic']:.2f}")
                 return best_model
+
+            print("❌ No SARIMA config could be fitted")
+            return None
             
         except Exception as e:
             print(f"❌ SARIMA training failed: {e}")
             return None
+
+    def evaluate_sarima_configs(self, series, configs, config_timeout=None, stage='full', return_model=False):
+        """Fit SARIMA configs concurrently, returning one timing record each"""
+        args = [(series, order, seasonal_order, return_model) for order, seasonal_order in configs]
+        records = []
+
+        for (order, seasonal_order), record in zip(configs, run_in_pool(fit_sarima_config, args, self.n_jobs, config_timeout)):
+            if isinstance(record, Exception):
+                fit_time = config_timeout if isinstance(record, TimeoutError) else 0.0
+                record = {'order': order, 'seasonal_order': seasonal_order, 'aic': None,
+                          'fit_time': fit_time, 'error': f"{type(record).__name__}: {record}"}
+            record['stage'] = stage
+            records.append(record)
+
+        return records
+
+    def _rank_sarima_configs(self, series, configs, factor, top_k, config_timeout, timing):
+        """Rank configs on a block-averaged series and keep the top_k of each seasonal period.
+
+        Configs are ranked against others with the same period only; those
+        whose period does not divide by factor are all kept.
+        """
+        coarse = series.groupby(np.arange(len(series)) // factor).mean()
+        kept = []
+
+        for period in dict.fromkeys(seasonal_order[3] for _, seasonal_order in configs):
+            group = [(order, seasonal_order) for order, seasonal_order in configs if seasonal_order[3] == period]
+            if len(group) <= top_k:
+                kept.extend(group)
+                continue
+            if period % factor or period // factor < 2:
+                print(f"⚠️ Cannot down-sample period {period} by {factor}, skipping ranking")
+                kept.extend(group)
+                continue
+
+            coarse_configs = [(order, seasonal_order[:3] + (period // factor,)) for order, seasonal_order in group]
+
+            print(f"Ranking {len(group)} SARIMA configs (period {period}) on {len(coarse)} down-sampled points...")
+            records = self.evaluate_sarima_configs(coarse, coarse_configs, config_timeout, stage=f'rank/{factor}')
+            timing.extend(records)
+
+            ranked = sorted(
+                (i for i, record in enumerate(records) if record['aic'] is not None),
+                key=lambda i: records[i]['aic']
+            )
+            kept.extend([group[i] for i in ranked[:top_k]] if ranked else group)
+
+        return kept
     
     def train_ml_model(self, df):
         """Train Random Forest with engineered features"""
@@ -187,8 +459,9 @@ class OptimalMoisturePrediction:
         X = df_features[feature_cols]
         y = df_features['Soil Moisture']
         
-        # Store feature names for later use
+        # Store feature names and how to compute them for later use
         self.feature_names = feature_cols
+        self.feature_plan = FeaturePlan.for_names(feature_cols).to_dict()
         
         # Time series split for validation
         tscv = TimeSeriesSplit(n_splits=3)
@@ -200,13 +473,14 @@ class OptimalMoisturePrediction:
             X_train, X_val = X.iloc[train_idx], X.iloc[val_idx]
             y_train, y_val = y.iloc[train_idx], y.iloc[val_idx]
             
+            # Per-device pool workers pass n_jobs=1 so their forests do not oversubscribe the cores
             rf_model = RandomForestRegressor(
                 n_estimators=100,
                 max_depth=15,
                 min_samples_split=5,
                 min_samples_leaf=2,
                 random_state=42,
-                n_jobs=-1
+                n_jobs=self.n_jobs or -1
             )
             
             rf_model.fit(X_train, y_train)
@@ -225,7 +499,7 @@ class OptimalMoisturePrediction:
             min_samples_split=5,
             min_samples_leaf=2,
             random_state=42,
-            n_jobs=-1
+            n_jobs=self.n_jobs or -1
         )
         final_rf.fit(X, y)
         
@@ -241,6 +515,7 @@ class OptimalMoisturePrediction:
         self.models['RandomForest'] = {
             'model': final_rf,
             'feature_names': feature_cols,
+            'feature_plan': self.feature_plan,
             'cv_score': avg_score,
             'feature_importance': feature_importance
         }
@@ -279,7 +554,7 @@ class OptimalMoisturePrediction:
                 elif model_name == 'RandomForest':
                     # Prepare test features
                     test_df = df.iloc[split_point:]
-                    test_features = self.prepare_features(test_df)
+                    test_features = self.prepare_features(test_df, FeaturePlan.from_model_data(model_info))
                     X_test = test_features[model_info['feature_names']].dropna()
                     
                     if len(X_test) == 0:
@@ -323,23 +598,32 @@ class OptimalMoisturePrediction:
         
         return results
     
-    def save_models(self, filepath='models/optimal_moisture_models.pkl'):
-        """Save all trained models"""
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        
-        model_data = {
+    def build_model_data(self):
+        """The artifact dictionary the prediction API loads"""
+        return {
             'models': self.models,
             'best_model_name': self.best_model_name,
             'best_model': self.best_model,
             'feature_names': self.feature_names,
-            'training_timestamp': pd.Timestamp.now().isoformat()
+            'feature_plan': self.feature_plan,
+            'training_timestamp': pd.Timestamp.now().isoformat(),
+            # Newest reading used, so incremental updates know where to resume
+            'data_end_timestamp': self.data_end_timestamp
         }
+
+    def save_models(self, store_dir=MODEL_STORE_DIR):
+        """Save all trained models as a manifest plus one file per model"""
+        model_data = self.build_model_data()
         
-        joblib.dump(model_data, filepath)
-        print(f"✅ All models saved to {filepath}")
+        # The manifest is swapped in last so a running API never loads a partial artifact
+        manifest = save_model_store(model_data, store_dir)
+        print(f"✅ All models saved to {store_dir}")
+        for model_name, entry in manifest['models'].items():
+            size_mb = os.path.getsize(os.path.join(store_dir, entry['file'])) / (1024 * 1024)
+            print(f"   - {model_name}: {entry['file']} ({size_mb:.1f} MB)")
         
         # Save summary
-        summary_path = filepath.replace('.pkl', '_summary.txt')
+        summary_path = store_dir.rstrip('/') + '_summary.txt'
         with open(summary_path, 'w') as f:
             f.write(f"Model Training Summary\n")
             f.write(f"=====================\n")
@@ -351,19 +635,218 @@ class OptimalMoisturePrediction:
         
         print(f"✅ Summary saved to {summary_path}")
 
-def fetch_live_detailed_data():
-    """Fetch data from your API endpoint"""
-    try:
-        url = "http://localhost:3001/moisture-detailed?bucket_min=2&window_min=10080"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        return pd.DataFrame(data)
-    except Exception as e:
-        print(f"❌ Error fetching data: {e}")
-        return None
+def incremental_update(model_data, new_df, forest_refresh_trees=None, progress=None, context_df=None):
+    """Update trained models with readings that arrived after the last training.
+
+    ARIMA/SARIMA results are extended by filtering the new observations
+    through the fitted parameters (no re-estimation). The forest gets
+    forest_refresh_trees new trees fitted on the new rows (default: a tenth
+    of the forest) and drops the same number of its oldest trees.
+    context_df holds the readings just before new_df (see
+    fetch_new_readings); they only feed the lag and rolling features of the
+    first new rows. Both must be preprocessed like the training data.
+    Returns model_data.
+    """
+    progress = progress or (lambda fraction, message: None)
+
+    series = new_df['Soil Moisture'].dropna()
+    if 'timestamp' in new_df.columns:
+        series = new_df.sort_values('timestamp')['Soil Moisture'].dropna()
+
+    update_log = {'timestamp': pd.Timestamp.now().isoformat(), 'new_records': len(new_df)}
+    steps = list(model_data['models'].items())
+
+    for step, (model_name, model_info) in enumerate(steps):
+        progress(step / len(steps), f"Updating {model_name}")
+
+        if model_name in ['ARIMA', 'SARIMA']:
+            if len(series) == 0:
+                continue
+
+            previous_nobs = model_info['model'].nobs
+            model_info['model'] = model_info['model'].append(series.to_numpy(), refit=False)
+
+            # Keep the drift statistics describing all data the state has seen
+            if 'train_mean' in model_info:
+                n, m = previous_nobs, len(series)
+                mean = (n * model_info['train_mean'] + m * series.mean()) / (n + m)
+                var = (n * (model_info['train_std'] ** 2 + (model_info['train_mean'] - mean) ** 2)
+                       + m * (series.var(ddof=0) + (series.mean() - mean) ** 2)) / (n + m)
+                model_info['train_mean'], model_info['train_std'] = float(mean), float(np.sqrt(var))
+
+            update_log[model_name] = f"filtered {len(series)} new observations"
+
+        elif model_name == 'RandomForest':
+            plan = FeaturePlan.from_model_data(model_info)
+            frame = new_df if context_df is None else pd.concat([context_df, new_df], ignore_index=True)
+            # Context rows are older than every new row, so they stay in front after sorting
+            features = OptimalMoisturePrediction().prepare_features(frame, plan)
+            features = features.iloc[len(frame) - len(new_df):].dropna()
+            if len(features) < 20:
+                update_log[model_name] = f"skipped ({len(features)} complete rows)"
+                continue
+
+            rf_model = model_info['model']
+            n_new = forest_refresh_trees or max(1, len(rf_model.estimators_) // 10)
+
+            # warm_start seeds the added trees from random_state advanced by the
+            # forest size, which dropping old trees keeps constant; a new seed
+            # per update keeps them from repeating the previous update's trees
+            previous_seed = rf_model.random_state if isinstance(rf_model.random_state, (int, np.integer)) else 0
+            update_number = len(model_data.get('incremental_updates', [])) + 1
+            seed = int(np.random.SeedSequence([int(previous_seed), update_number]).generate_state(1)[0])
+
+            # warm_start fits only the added trees, on the new rows
+            rf_model.set_params(warm_start=True, n_estimators=len(rf_model.estimators_) + n_new, random_state=seed)
+            rf_model.fit(features[model_info['feature_names']], features['Soil Moisture'])
+
+            # Drop the oldest trees so the forest keeps its size
+            rf_model.estimators_ = rf_model.estimators_[n_new:]
+            rf_model.set_params(warm_start=False, n_estimators=len(rf_model.estimators_))
+
+            model_info['feature_importance'] = pd.DataFrame({
+                'feature': model_info['feature_names'],
+                'importance': rf_model.feature_importances_
+            }).sort_values('importance', ascending=False)
 
-def preprocess_data(df):
+            update_log[model_name] = f"replaced {n_new} trees using {len(features)} rows"
+
+    if model_data.get('best_model_name') in model_data['models']:
+        model_data['best_model'] = model_data['models'][model_data['best_model_name']]
+
+    if 'timestamp' in new_df.columns and len(new_df):
+        model_data['data_end_timestamp'] = new_df['timestamp'].max().isoformat()
+    model_data['training_timestamp'] = update_log['timestamp']
+    model_data.setdefault('incremental_updates', []).append(update_log)
+
+    progress(1.0, "Update complete")
+    return model_data
+
+def fetch_new_readings(model_data):
+    """Readings newer than the data the models were last trained or updated on.
+
+    Returns (context_df, new_df), or (None, None) without readings.
+    context_df holds the last readings up to the previous end, as many as
+    the forest's features look back, so the first new rows get their lags.
+    """
+    since = pd.Timestamp(model_data.get('data_end_timestamp') or model_data['training_timestamp'])
+
+    lookback = 0
+    if 'RandomForest' in model_data['models']:
+        plan = FeaturePlan.from_model_data(model_data['models']['RandomForest'])
+        lookback = plan.lookback if plan is not None else 0
+
+    # Backend timestamps are naive UTC; the context reaches back twice its
+    # span in buckets, to allow for missing readings
+    window_min = int((pd.Timestamp.now('UTC').tz_localize(None) - since).total_seconds() // 60) + 1
+    window_min += 2 * lookback * DEFAULT_BUCKET_MIN
+
+    df = preprocess_data(load_sensor_history(window_min=max(window_min, 1)))
+    if df is None:
+        return None, None
+
+    is_new = df['timestamp'] > since
+    context_df = df[~is_new].tail(lookback).reset_index(drop=True)
+    return context_df, df[is_new].reset_index(drop=True)
+
+def train_device_models(device_name, device_df, arima_search='grid', sarima_options=None):
+    """Train and compare every candidate model for one device (runs in a worker)"""
+    device_df = device_df.drop(columns=['devicename']).reset_index(drop=True)
+
+    if len(device_df) < 100:
+        return {'device_name': device_name, 'n_records': len(device_df),
+                'error': f'Insufficient data ({len(device_df)} records)'}
+
+    # Pool workers cannot start pools of their own, so searches run serially here
+    predictor = OptimalMoisturePrediction(n_jobs=1)
+    if 'timestamp' in device_df.columns:
+        predictor.data_end_timestamp = device_df['timestamp'].max().isoformat()
+
+    print(f"\n🔧 [{device_name}] Training on {len(device_df)} records...")
+    if arima_search == 'stepwise':
+        predictor.train_arima_model(device_df, search='stepwise', max_p=5, max_q=5)
+    else:
+        predictor.train_arima_model(device_df)
+    predictor.train_sarima_model(device_df, seasonal_period=24 if len(device_df) > 48 else 12, **(sarima_options or {}))
+    predictor.train_ml_model(device_df)
+
+    if predictor.models:
+        predictor.compare_models(device_df, test_days=min(30, len(device_df) // 4))
+
+    if not predictor.best_model_name:
+        return {'device_name': device_name, 'n_records': len(device_df), 'error': 'No model could be trained'}
+
+    # Slim here, so the parent never holds every device's full fit results at once
+    model_data = predictor.build_model_data()
+    for model_name, model_info in model_data['models'].items():
+        slim_model_info(model_name, model_info)
+
+    return {
+        'device_name': device_name,
+        'n_records': len(device_df),
+        'model_data': model_data,
+        'error': None
+    }
+
+def train_per_device(df, n_jobs=None, arima_search='grid', sarima_options=None, registry_dir=DEVICE_REGISTRY_DIR):
+    """Partition the data by device, train devices in parallel and save a registry"""
+    partitions = [
+        (device_name, device_df, arima_search, sarima_options)
+        for device_name, device_df in df.groupby('devicename')
+    ]
+    print(f"🧩 Training {len(partitions)} devices on {resolve_n_jobs(n_jobs)} worker processes...")
+
+    results = []
+    for (device_name, device_df, _, _), result in zip(partitions, run_in_pool(train_device_models, partitions, n_jobs)):
+        if isinstance(result, Exception):
+            result = {'device_name': device_name, 'n_records': len(device_df), 'error': f"{type(result).__name__}: {result}"}
+        results.append(result)
+
+    return save_device_registry(results, registry_dir)
+
+def save_device_registry(device_results, registry_dir=DEVICE_REGISTRY_DIR):
+    """Write one model file per device plus a registry.json index"""
+    os.makedirs(registry_dir, exist_ok=True)
+
+    registry = {
+        'training_timestamp': pd.Timestamp.now().isoformat(),
+        'devices': {}
+    }
+
+    for result in device_results:
+        device_name = result['device_name']
+
+        if result['error']:
+            print(f"  ❌ {device_name}: {result['error']}")
+            registry['devices'][device_name] = {'n_records': result['n_records'], 'error': result['error']}
+            continue
+
+        model_data = result['model_data']
+        filename = re.sub(r'[^A-Za-z0-9_.-]', '_', device_name) + '.pkl'
+        # Replaced in one step, as a serving bundle may be loading the old file
+        model_path = os.path.join(registry_dir, filename)
+        joblib.dump(model_data, model_path + '.tmp')
+        os.replace(model_path + '.tmp', model_path)
+
+        registry['devices'][device_name] = {
+            'file': filename,
+            'best_model_name': model_data['best_model_name'],
+            'models': list(model_data['models'].keys()),
+            'n_records': result['n_records'],
+            'training_timestamp': model_data['training_timestamp']
+        }
+        print(f"  ✅ {device_name}: {model_data['best_model_name']} ({result['n_records']} records)")
+
+    # Replace the index in one step so the API never reads a half-written file
+    registry_path = os.path.join(registry_dir, 'registry.json')
+    with open(registry_path + '.tmp', 'w') as f:
+        json.dump(registry, f, indent=2)
+    os.replace(registry_path + '.tmp', registry_path)
+
+    print(f"✅ Device registry saved to {registry_path}")
+    return registry
+
+def preprocess_data(df, keep_devicename=False):
     """Preprocess the fetched data"""
     if df is None or df.empty:
         return None
@@ -387,8 +870,9 @@ def preprocess_data(df):
         if col != 'Soil Moisture':
             df[col].fillna(df[col].median(), inplace=True)
     
-    # Remove devicename if present
-    df = df.drop(columns=["devicename"], errors="ignore")
+    # Remove devicename if present (per-device training partitions on it)
+    if not keep_devicename:
+        df = df.drop(columns=["devicename"], errors="ignore")
     
     print(f"✅ Preprocessed data shape: {df.shape}")
     return df
@@ -398,8 +882,8 @@ def main():
     print("=" * 60)
     
     # Fetch data
-    print("\n📡 Fetching live sensor data...")
-    df = fetch_live_detailed_data()
+    print("\n📡 Syncing and loading sensor history...")
+    df = load_sensor_history()
     
     if df is None:
         print("❌ Failed to fetch data. Exiting.")
@@ -407,26 +891,44 @@ def main():
     
     # Preprocess data
     print("\n🔧 Preprocessing data...")
-    df = preprocess_data(df)
+    df = preprocess_data(df, keep_devicename=TRAINING_MODE == 'per_device')
     
     if df is None or len(df) < 100:
         print("❌ Insufficient data for training. Need at least 100 records.")
         return
+
+    if TRAINING_MODE == 'per_device':
+        print("\n🤖 Training one model set per device...")
+        registry = train_per_device(df, arima_search=ARIMA_SEARCH, sarima_options=sarima_search_options())
+
+        trained = [name for name, entry in registry['devices'].items() if 'error' not in entry]
+        print(f"📊 Devices trained: {len(trained)}/{len(registry['devices'])}")
+        print(f"📁 Registry saved to: {DEVICE_REGISTRY_DIR}/registry.json")
+
+        # The API loads the global models first and serves every device
+        # without a model of its own from them, so they are always trained
+        print("\n🌐 Training the global fallback models...")
+        df = df.drop(columns=['devicename'])
     
     # Initialize predictor
     predictor = OptimalMoisturePrediction()
+    if 'timestamp' in df.columns:
+        predictor.data_end_timestamp = df['timestamp'].max().isoformat()
     
     # Train models
     print(f"\n🤖 Training models on {len(df)} records...")
     
-    # Train ARIMA
+    # Train ARIMA (stepwise search can afford wider orders than the grid)
     print("\n1️⃣ Training ARIMA...")
-    predictor.train_arima_model(df)
+    if ARIMA_SEARCH == 'stepwise':
+        predictor.train_arima_model(df, search='stepwise', max_p=5, max_q=5)
+    else:
+        predictor.train_arima_model(df)
     
     # Train SARIMA (adjust seasonal_period based on your data frequency)
     print("\n2️⃣ Training SARIMA...")
     seasonal_period = 24 if len(df) > 48 else 12  # Adjust based on data frequency
-    predictor.train_sarima_model(df, seasonal_period=seasonal_period)
+    predictor.train_sarima_model(df, seasonal_period=seasonal_period, **sarima_search_options())
     
     # Train Random Forest
     print("\n3️⃣ Training Random Forest...")
@@ -445,7 +947,7 @@ def main():
         print(f"📊 Models trained: {list(predictor.models.keys())}")
         if predictor.best_model_name:
             print(f"🏆 Best model: {predictor.best_model_name}")
-            print(f"📁 Models saved to: models/optimal_moisture_models.pkl")
+            print(f"📁 Models saved to: {MODEL_STORE_DIR}")
         
     else:
         print("❌ No models were successfully trained.")
@@ -0,0 +1,232 @@
+"""
+Request encodings for /predict/moisture/batch.
+
+Besides the original row format (``recent_data`` as a list of reading dicts),
+a device can be sent as columns, one array per field, with
+``devicetimestamp`` as epoch integers (``timestamp_unit``: s, ms (default),
+us or ns, naive UTC):
+
+    JSON-columnar (application/json)
+        {"days_ahead": 30, "timestamp_unit": "ms",
+         "devices": {"dev-1": {"columns": {"devicetimestamp": [...], "moisture": [...], ...}}}}
+
+    msgpack (application/msgpack)
+        the same document; any column may also be raw little-endian bytes
+        (int64 timestamps, float64 values), which are used without copying
+
+    Arrow IPC stream (application/vnd.apache.arrow.stream)
+        one table with a devicename column and one column per field; the
+        other request options (days_ahead, execution_mode, ...) go in the
+        query string
+
+Columns are decoded straight into NumPy arrays (ReadingColumns), without
+building a dict per reading.
+"""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import msgpack
+except ImportError:  # optional; only needed for msgpack requests
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional; only needed for Arrow requests
+    pa = None
+
+TIMESTAMP_COLUMN = 'devicetimestamp'
+DEVICE_COLUMN = 'devicename'
+TIMESTAMP_UNITS = ['s', 'ms', 'us', 'ns']
+
+MSGPACK_TYPES = ['application/msgpack', 'application/x-msgpack']
+ARROW_TYPES = ['application/vnd.apache.arrow.stream']
+
+# Query string options of Arrow requests and their types
+ARROW_QUERY_OPTIONS = {
+    'days_ahead': int,
+    'execution_mode': str,
+    'max_workers': int,
+    'device_timeout': float,
+    'response_format': str,
+    'timestamp_unit': str
+}
+
+
+class ReadingColumns:
+    """One device's readings as equal-length column arrays.
+
+    Stands in for a recent_data list: len() is the number of readings and
+    to_frame() gives the same DataFrame as pd.DataFrame(recent_data).
+    """
+
+    def __init__(self, columns):
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+        self.columns = columns
+        self.length = lengths.pop() if lengths else 0
+
+    def __len__(self):
+        return self.length
+
+    def keys(self):
+        return self.columns.keys()
+
+    def to_frame(self):
+        return pd.DataFrame(self.columns, copy=False)
+
+    def fingerprint(self):
+        """Stable hash of the readings (the columnar counterpart of DeviceModelCache.fingerprint)"""
+        digest = hashlib.sha1()
+        for name in sorted(self.columns):
+            values = self.columns[name]
+            digest.update(f"{name}:{values.dtype.str}:".encode('utf-8'))
+            if values.dtype == object:
+                digest.update(json.dumps(values.tolist(), default=str).encode('utf-8'))
+            else:
+                digest.update(np.ascontiguousarray(values).tobytes())
+        return digest.hexdigest()
+
+
+def decode_column(name, values, timestamp_unit='ms'):
+    """One encoded column (list or raw little-endian bytes) as a NumPy array"""
+    raw = isinstance(values, (bytes, bytearray, memoryview))
+
+    if name == TIMESTAMP_COLUMN:
+        epochs = np.frombuffer(values, dtype='<i8') if raw else np.asarray(values, dtype=np.int64)
+        return epochs.astype(f'datetime64[{timestamp_unit}]')
+    if raw:
+        return np.frombuffer(values, dtype='<f8')
+
+    try:
+        # None (a missing reading) becomes NaN
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.asarray(values, dtype=object)
+
+
+def decode_device_columns(columns, timestamp_unit='ms'):
+    return ReadingColumns({name: decode_column(name, values, timestamp_unit) for name, values in columns.items()})
+
+
+def decode_columnar_devices(data):
+    """Replace every device's "columns" entry in a parsed request by recent_data ReadingColumns, in place"""
+    timestamp_unit = data.get('timestamp_unit', 'ms')
+    if timestamp_unit not in TIMESTAMP_UNITS:
+        raise ValueError(f"timestamp_unit must be one of {TIMESTAMP_UNITS}")
+
+    for device_info in data.get('devices', {}).values():
+        if isinstance(device_info, dict) and 'columns' in device_info:
+            device_info['recent_data'] = decode_device_columns(device_info.pop('columns'), timestamp_unit)
+    return data
+
+
+def decode_arrow_devices(body, timestamp_unit='ms'):
+    """{device_name: {'recent_data': ReadingColumns}} from an Arrow IPC stream"""
+    table = pa.ipc.open_stream(body).read_all().combine_chunks()
+    if DEVICE_COLUMN not in table.column_names:
+        raise ValueError(f"Arrow table has no {DEVICE_COLUMN} column")
+
+    # Group the rows by device (devices keep their first-seen order)
+    codes, device_names = pd.factorize(table.column(DEVICE_COLUMN).to_numpy(zero_copy_only=False))
+    order = np.argsort(codes, kind='stable')
+    offsets = np.cumsum(np.bincount(codes, minlength=len(device_names)))[:-1]
+
+    split_columns = {}
+    for name in table.column_names:
+        if name == DEVICE_COLUMN:
+            continue
+        column = table.column(name)
+        if name == TIMESTAMP_COLUMN and pa.types.is_integer(column.type):
+            values = column.to_numpy().astype(np.int64).astype(f'datetime64[{timestamp_unit}]')
+        else:
+            values = column.to_numpy(zero_copy_only=False)
+        split_columns[name] = np.split(values[order], offsets)
+
+    return {
+        device_name: {'recent_data': ReadingColumns({name: parts[i] for name, parts in split_columns.items()})}
+        for i, device_name in enumerate(device_names)
+    }
+
+
+def parse_batch_request(mimetype, body, args):
+    """Batch request document of a msgpack or Arrow body; args is the query string"""
+    if mimetype in MSGPACK_TYPES:
+        if msgpack is None:
+            raise ValueError("msgpack requests need the msgpack package")
+        return decode_columnar_devices(msgpack.unpackb(body, raw=False))
+
+    if mimetype in ARROW_TYPES:
+        if pa is None:
+            raise ValueError("Arrow requests need the pyarrow package")
+        data = {name: cast(args[name]) for name, cast in ARROW_QUERY_OPTIONS.items() if name in args}
+        timestamp_unit = data.pop('timestamp_unit', 'ms')
+        if timestamp_unit not in TIMESTAMP_UNITS:
+            raise ValueError(f"timestamp_unit must be one of {TIMESTAMP_UNITS}")
+        data['devices'] = decode_arrow_devices(body, timestamp_unit)
+        return data
+
+    raise ValueError(f"Unsupported request content type: {mimetype}")
+
+
+def rows_to_columns(recent_data, timestamp_unit='ms'):
+    """Encode a recent_data list as JSON-columnar columns (epoch timestamps)"""
+    columns = {name: [record.get(name) for record in recent_data] for name in recent_data[0]} if recent_data else {}
+    if TIMESTAMP_COLUMN in columns:
+        timestamps = pd.to_datetime(columns[TIMESTAMP_COLUMN]).as_unit(timestamp_unit)
+        columns[TIMESTAMP_COLUMN] = timestamps.asi8.tolist()
+    return columns
+
+
+def encode_columnar_json(payload, timestamp_unit='ms'):
+    """Row-format batch payload re-encoded as a JSON-columnar document"""
+    encoded = {key: value for key, value in payload.items() if key != 'devices'}
+    encoded['timestamp_unit'] = timestamp_unit
+    encoded['devices'] = {
+        device_name: {'columns': rows_to_columns(device_info['recent_data'], timestamp_unit)}
+        for device_name, device_info in payload['devices'].items()
+    }
+    return encoded
+
+
+def encode_msgpack(payload, timestamp_unit='ms'):
+    """Row-format batch payload as msgpack, numeric columns as raw little-endian bytes"""
+    encoded = encode_columnar_json(payload, timestamp_unit)
+    for device_info in encoded['devices'].values():
+        for name, values in device_info['columns'].items():
+            if name == TIMESTAMP_COLUMN:
+                device_info['columns'][name] = np.asarray(values, dtype='<i8').tobytes()
+            else:
+                column = decode_column(name, values)
+                if column.dtype != object:
+                    device_info['columns'][name] = column.astype('<f8').tobytes()
+    return msgpack.packb(encoded, use_bin_type=True)
+
+
+def encode_arrow(payload, timestamp_unit='ms'):
+    """Row-format batch payload as an Arrow IPC stream (options are not included)"""
+    device_names, columns = [], {}
+    for device_name, device_info in payload['devices'].items():
+        device_columns = rows_to_columns(device_info['recent_data'], timestamp_unit)
+        device_names.extend([device_name] * len(device_info['recent_data']))
+        for name, values in device_columns.items():
+            columns.setdefault(name, []).extend(values)
+
+    arrays = {DEVICE_COLUMN: pa.array(device_names, type=pa.dictionary(pa.int32(), pa.string()))}
+    for name, values in columns.items():
+        if name == DEVICE_COLUMN:
+            continue
+        if name == TIMESTAMP_COLUMN:
+            arrays[name] = pa.array(values, type=pa.timestamp(timestamp_unit))
+        else:
+            arrays[name] = pa.array(values)
+
+    table = pa.table(arrays)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()